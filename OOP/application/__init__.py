@@ -1,15 +1,28 @@
-"""Application layer: services & use cases."""
-
-from application.services import (
-    AuthService,
-    BookService,
-    LoanService,
-    DatabaseInitializer,
-)
-
-__all__ = [
-    "AuthService",
-    "BookService",
-    "LoanService",
-    "DatabaseInitializer",
-]
+"""Application layer: services & use cases.
+
+Names are imported on first access (PEP 562), so importing one submodule,
+as main.py does, does not also load the asyncio services.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "AuthService": "application.services",
+    "BookService": "application.services",
+    "LoanService": "application.services",
+    "DatabaseInitializer": "application.services",
+    "AsyncAuthService": "application.async_services",
+    "AsyncBookService": "application.async_services",
+    "AsyncLoanService": "application.async_services",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,120 @@
+"""Asyncio counterparts of the services in application/services.py.
+
+Business rules are the same; the difference is that every database call is
+awaited through an async repository and PBKDF2 work is awaited on the
+hasher's thread pool (or, for a hasher without workers, the loop's default
+executor), so neither blocks the event loop.
+"""
+
+import asyncio
+from typing import AsyncIterator, Optional
+
+from entities import User, Loan
+from utils import PasswordHasher
+from ports import AsyncUserRepositoryPort, AsyncBookRepositoryPort, AsyncLoanRepositoryPort
+from application.services import (
+    PAGE_SIZE, SEARCH_LIMIT, check_page_size, decode_cursor, next_cursor, borrow_template,
+)
+
+
+class AsyncAuthService:
+    def __init__(self, user_repo: AsyncUserRepositoryPort, hasher: PasswordHasher):
+        self.user_repo = user_repo
+        self.hasher = hasher
+
+    async def login(self, username: str, password: str):
+        row = await self.user_repo.find_by_username(username)
+        if not row:
+            return None
+        ok = await self._off_loop(self.hasher.submit_verify, row.password_hash, password, row.username)
+        if not ok:
+            return None
+        if self.hasher.needs_rehash(row.password_hash):
+            new_hash = await self._off_loop(self.hasher.submit_hash, password)
+            await self.user_repo.update_password_hash(row.id, new_hash)
+        return User(row.id, row.username, row.role)
+
+    async def register(self, username: str, password: str):
+        password_hash = await self._off_loop(self.hasher.submit_hash, password)
+        await self.user_repo.create(username, password_hash, "pengunjung")
+
+    async def upsert_admin(self, username: str, password: str):
+        password_hash = await self._off_loop(self.hasher.submit_hash, password)
+        await self.user_repo.promote_or_upsert_admin(username, password_hash)
+
+    async def _off_loop(self, submit, *args):
+        if self.hasher.workers:
+            return await asyncio.wrap_future(submit(*args))
+        # without workers submit_* runs PBKDF2 inline, which would stall the loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: submit(*args).result())
+
+
+class AsyncBookService:
+    def __init__(self, book_repo: AsyncBookRepositoryPort):
+        self.book_repo = book_repo
+
+    async def list_all(self):
+        return await self.book_repo.list_all()
+
+    async def list_available(self):
+        return await self.book_repo.list_available()
+
+    async def page(self, cursor: Optional[str] = None, size: int = PAGE_SIZE, available_only: bool = False):
+        """Return ``(rows, next_cursor)``; same cursor format as BookService.page."""
+        rows = await self.book_repo.list_page(decode_cursor(cursor), check_page_size(size), available_only)
+        return rows, next_cursor(rows, size)
+
+    async def iter_books(self, available_only: bool = False, batch_size: int = 500) -> AsyncIterator:
+        after_id = 0
+        while True:
+            rows = await self.book_repo.list_page(after_id, batch_size, available_only)
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].id
+
+    async def search(self, q: str, limit: int = SEARCH_LIMIT):
+        return await self.book_repo.search(q, limit)
+
+    async def get(self, book_id: int):
+        return await self.book_repo.get_by_id(book_id)
+
+    async def add(self, title, author, year, copies):
+        await self.book_repo.add(title, author, year, copies)
+
+    async def update_stock(self, book_id, total):
+        await self.book_repo.update_stock(book_id, total)
+
+    async def delete(self, book_id):
+        await self.book_repo.delete(book_id)
+
+
+class AsyncLoanService:
+    def __init__(self, loan_repo: AsyncLoanRepositoryPort):
+        self.loan_repo = loan_repo
+
+    async def borrow(self, user: User, book_id: int):
+        await self.loan_repo.create_loan_and_decrease_stock(Loan.create(user.id, book_id))
+
+    async def borrow_many(self, user: User, book_ids, atomic: bool = True):
+        """Same rules as LoanService.borrow_many."""
+        book_ids = list(book_ids)
+        template = borrow_template(user, book_ids)
+        return await self.loan_repo.create_loans(user.id, book_ids, template.loan_date, template.due_date, atomic)
+
+    async def return_book(self, user: User, loan_id: int):
+        await self.loan_repo.return_loan(loan_id, user.id)
+
+    async def return_many(self, user: User, loan_ids):
+        return await self.loan_repo.return_loans(loan_ids, user.id)
+
+    async def active_loans_by_user(self, user: User):
+        return await self.loan_repo.active_loans_by_user(user.id)
+
+    async def history_page(self, user: User, cursor: Optional[str] = None, size: int = PAGE_SIZE,
+                           archived: bool = False):
+        """Return ``(rows, next_cursor)``; same cursor format as LoanService.history_page."""
+        rows = await self.loan_repo.history_by_user(user.id, decode_cursor(cursor), check_page_size(size), archived)
+        return rows, next_cursor(rows, size, "loan_id")
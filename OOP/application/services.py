@@ -1,7 +1,61 @@
-from entities import User, Loan
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional
+from entities import User, Loan, BookStats
 from utils import PasswordHasher
-from ports import UserRepositoryPort, BookRepositoryPort, LoanRepositoryPort
+from ports import (
+    UserRepositoryPort, BookRepositoryPort, LoanRepositoryPort, HoldRepositoryPort, ReportRepositoryPort,
+    JobStateRepositoryPort, AvailabilityIndexPort,
+)
 from infrastructure.database import Database
+from infrastructure.migrations import migrate, restore_suspended_indexes, abandoned_import
+from infrastructure.importer import iter_book_records
+
+SEARCH_LIMIT = 50
+PAGE_SIZE = 20
+IMPORT_CHUNK_SIZE = 5000
+DUE_SOON_DAYS = 2
+ARCHIVE_AFTER_MONTHS = 12
+BORROW_MANY_LIMIT = 50
+
+
+def check_page_size(size: int) -> int:
+    if size < 1:
+        raise ValueError("Ukuran halaman minimal 1")
+    return size
+
+
+def check_copies(copies: int) -> int:
+    if copies < 0:
+        raise ValueError("Jumlah eksemplar tidak boleh negatif")
+    return copies
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Id to continue after; a missing cursor starts at the beginning."""
+    if not cursor:
+        return 0
+    try:
+        after_id = int(cursor)
+    except ValueError:
+        raise ValueError("Cursor halaman tidak valid") from None
+    if not 0 <= after_id < 2**63:
+        raise ValueError("Cursor halaman tidak valid")
+    return after_id
+
+
+def next_cursor(rows, size: int, key: str = "id") -> Optional[str]:
+    """Cursor of the page after ``rows`` (their last ``key``), or None on the last page."""
+    return str(getattr(rows[-1], key)) if len(rows) == size else None
+
+
+def borrow_template(user: User, book_ids) -> Loan:
+    """Validate a borrow_many stack; every book in it gets the returned loan's dates."""
+    if not book_ids:
+        raise ValueError("Pilih minimal satu buku")
+    if len(book_ids) > BORROW_MANY_LIMIT:
+        raise ValueError(f"Maksimal {BORROW_MANY_LIMIT} buku sekali pinjam")
+    return Loan.create(user.id, book_ids[0])
 
 
 class AuthService:
@@ -13,9 +67,17 @@ class AuthService:
         row = self.user_repo.find_by_username(username)
         if not row:
             return None
-        if self.hasher.verify(row["password_hash"], password):
-            return User(row["id"], row["username"], row["role"])
-        return None
+        if not self.hasher.verify(row.password_hash, password, user=row.username):
+            return None
+        if self.hasher.needs_rehash(row.password_hash):
+            # cost parameters changed: upgrade this user's hash while we know the password
+            self.user_repo.update_password_hash(row.id, self.hasher.hash(password))
+        return User(row.id, row.username, row.role)
+
+    def find_user(self, username: str) -> Optional[User]:
+        """Look up an account without a password (trusted local commands only)."""
+        row = self.user_repo.find_by_username(username)
+        return User(row.id, row.username, row.role) if row else None
 
     def register(self, username: str, password: str):
         self.user_repo.create(username, self.hasher.hash(password), "pengunjung")
@@ -27,8 +89,10 @@ class AuthService:
 
 
 class BookService:
-    def __init__(self, book_repo: BookRepositoryPort):
+    def __init__(self, book_repo: BookRepositoryPort, availability: AvailabilityIndexPort = None):
         self.book_repo = book_repo
+        # optional in-memory index answering availability without a query
+        self.availability = availability
 
     def list_all(self):
         return self.book_repo.list_all()
@@ -36,14 +100,100 @@ class BookService:
     def list_available(self):
         return self.book_repo.list_available()
 
-    def search(self, q: str):
-        return self.book_repo.search(q)
+    def page(self, cursor: Optional[str] = None, size: int = PAGE_SIZE, available_only: bool = False):
+        """Return ``(rows, next_cursor)``; ``next_cursor`` is None on the last page."""
+        rows = self.book_repo.list_page(decode_cursor(cursor), check_page_size(size), available_only)
+        return rows, next_cursor(rows, size)
+
+    def iter_books(self, available_only: bool = False, batch_size: int = 500) -> Iterator:
+        """Stream the catalog in id order, holding one batch in memory at a time."""
+        after_id = 0
+        while True:
+            rows = self.book_repo.list_page(after_id, batch_size, available_only)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].id
+
+    def search(self, q: str, limit: int = SEARCH_LIMIT):
+        return self.book_repo.search(q, limit)
+
+    def get(self, book_id: int):
+        return self.book_repo.get_by_id(book_id)
+
+    def available_copies(self, book_id: int) -> Optional[int]:
+        """Copies on the shelf, or None when there is no such book."""
+        if self.availability is not None:
+            return self.availability.available(book_id)
+        book = self.book_repo.get_by_id(book_id)
+        return book.copies_available if book else None
+
+    def is_available(self, book_id: int) -> bool:
+        return (self.available_copies(book_id) or 0) > 0
+
+    def available_ids(self, after_id: int = 0, limit: int = PAGE_SIZE) -> List[int]:
+        """Ids of books with a copy on the shelf, ascending, after ``after_id``."""
+        if self.availability is not None:
+            return self.availability.available_ids(after_id, limit)
+        return [book.id for book in self.book_repo.list_page(after_id, limit, available_only=True)]
 
     def add(self, title, author, year, copies):
-        self.book_repo.add(title, author, year, copies)
+        self.book_repo.add(title, author, year, check_copies(copies))
+
+    def bulk_import(
+        self,
+        path: str,
+        fmt: Optional[str] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        resume: bool = False,
+        defer_indexes: bool = True,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        """Stream books from a CSV/JSONL file into the catalog in chunked transactions.
+
+        Each chunk is one transaction that also records how far the file has
+        been read, so ``resume=True`` continues after the last committed chunk
+        of an interrupted run. Titles already in the catalog (same title and
+        author) are counted as duplicates and skipped. With ``defer_indexes``
+        the search index is rebuilt once at the end instead of per row.
+        """
+        source = os.path.abspath(path)
+        start = self.book_repo.import_position(source) if resume else 0
+        stats = {"inserted": 0, "duplicates": 0, "invalid": 0, "position": start}
+
+        def flush(chunk, position):
+            inserted = self.book_repo.bulk_insert(chunk, source, position)
+            stats["inserted"] += inserted
+            stats["duplicates"] += len(chunk) - inserted
+            stats["position"] = position
+            if progress:
+                progress(dict(stats))
+
+        if defer_indexes:
+            self.book_repo.suspend_search_index()
+        try:
+            chunk = []
+            position = start
+            for position, record in iter_book_records(path, fmt):
+                if position <= start:
+                    continue
+                if record is None:
+                    stats["invalid"] += 1
+                    continue
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    flush(chunk, position)
+                    chunk = []
+            if chunk or position > stats["position"]:
+                flush(chunk, position)
+            self.book_repo.clear_import_position(source)
+        finally:
+            if defer_indexes:
+                self.book_repo.rebuild_search_index()
+        return stats
 
     def update_stock(self, book_id, total):
-        self.book_repo.update_stock(book_id, total)
+        self.book_repo.update_stock(book_id, check_copies(total))
 
     def delete(self, book_id):
         self.book_repo.delete(book_id)
@@ -55,31 +205,145 @@ class LoanService:
         self.book_repo = book_repo
 
     def borrow(self, user: User, book_id: int):
-        # validate business rules first
-        book = self.book_repo.get_by_id(book_id)
-        if not book:
-            raise ValueError("Buku tidak ditemukan")
-        if book["copies_available"] <= 0:
-            raise ValueError("Buku tidak tersedia")
-        if self.loan_repo.find_active_by_user_and_book(user.id, book_id):
-            raise ValueError("Anda sudah meminjam buku ini")
-
-        # perform atomic DB operation (decrement + create loan)
+        # business rules (exists, in stock, not borrowed twice) are enforced
+        # inside the same transaction that decrements stock and creates the loan
         self.loan_repo.create_loan_and_decrease_stock(Loan.create(user.id, book_id))
 
+    def borrow_many(self, user: User, book_ids, atomic: bool = True):
+        """Borrow a stack of books in one transaction; returns a BorrowResult per book.
+
+        ``atomic=True`` borrows all of them or none; ``atomic=False`` borrows
+        whichever are available and reports the rest.
+        """
+        book_ids = list(book_ids)
+        template = borrow_template(user, book_ids)
+        return self.loan_repo.create_loans(user.id, book_ids, template.loan_date, template.due_date, atomic)
+
     def return_book(self, user: User, loan_id: int):
-        loan = self.loan_repo.find_active_by_id_and_user(loan_id, user.id)
-        if not loan:
-            raise ValueError("Data peminjaman tidak ditemukan")
+        # marks the loan returned and restocks the book atomically
+        self.loan_repo.return_loan(loan_id, user.id)
 
-        self.loan_repo.mark_returned(loan_id)
-        self.book_repo.increase_stock(loan["book_id"])
+    def return_many(self, user: User, loan_ids):
+        """Return several loans at once; returns the ids that were returned."""
+        return self.loan_repo.return_loans(loan_ids, user.id)
 
     def active_loans_by_user(self, user: User):
         return self.loan_repo.active_loans_by_user(user.id)
 
-    def history_by_user(self, user: User):
-        return self.loan_repo.history_by_user(user.id)
+    def history_page(self, user: User, cursor: Optional[str] = None, size: int = PAGE_SIZE, archived: bool = False):
+        """Return ``(rows, next_cursor)`` of the user's loans, newest first.
+
+        ``archived=True`` pages through loans moved out by ``archive_returned``.
+        """
+        rows = self.loan_repo.history_by_user(user.id, decode_cursor(cursor), check_page_size(size), archived)
+        return rows, next_cursor(rows, size, "loan_id")
+
+    def archive_returned(self, months: int = ARCHIVE_AFTER_MONTHS, now: datetime = None) -> int:
+        """Archive loans returned more than ``months`` (counted as 30 days) ago."""
+        if months < 0:
+            raise ValueError("Jumlah bulan tidak boleh negatif")
+        now = now or datetime.utcnow()
+        return self.loan_repo.archive_returned((now - timedelta(days=30 * months)).isoformat())
+
+
+class HoldService:
+    """Reservations for books that are out on loan.
+
+    When a copy comes back it is set aside for the first holder in line,
+    who then borrows it through ``LoanService.borrow`` as usual before the
+    hold expires.
+    """
+
+    def __init__(self, hold_repo: HoldRepositoryPort):
+        self.hold_repo = hold_repo
+
+    def place(self, user: User, book_id: int) -> int:
+        return self.hold_repo.place(user.id, book_id)
+
+    def cancel(self, user: User, hold_id: int):
+        self.hold_repo.cancel(hold_id, user.id)
+
+    def by_user(self, user: User):
+        return self.hold_repo.by_user(user.id)
+
+    def expire(self, now: datetime = None) -> int:
+        """Release copies whose holders did not borrow them in time."""
+        return self.hold_repo.expire((now or datetime.utcnow()).isoformat())
+
+
+class ReportService:
+    """Admin circulation reports; all figures come from precomputed summaries."""
+
+    def __init__(self, report_repo: ReportRepositoryPort):
+        self.report_repo = report_repo
+
+    def top_books(self, limit: int = 10):
+        return self.report_repo.top_books(limit)
+
+    def top_users(self, limit: int = 10):
+        return self.report_repo.top_users(limit)
+
+    def daily(self, days: int = 14):
+        return self.report_repo.daily(days)
+
+    def utilization(self, book_id: int) -> BookStats:
+        """Loan counts of one title; ``.utilization`` is the share of copies lent out."""
+        stats = self.report_repo.book_stats(book_id)
+        if stats is None:
+            raise ValueError("Buku tidak ditemukan")
+        return stats
+
+
+class OverdueService:
+    """Finds overdue and due-soon loans for reminders.
+
+    ``overdue``/``due_soon`` stream the full current state. ``run_batch`` is
+    incremental: it keeps a watermark per kind in ``job_state`` and only
+    hands over loans whose deadline (or due-soon horizon) was crossed since
+    the previous run, so a scheduled job never notifies twice.
+    """
+
+    OVERDUE = "overdue"
+    DUE_SOON = "due_soon"
+
+    def __init__(self, loan_repo: LoanRepositoryPort, state_repo: JobStateRepositoryPort,
+                 due_soon_days: int = DUE_SOON_DAYS):
+        self.loan_repo = loan_repo
+        self.state_repo = state_repo
+        self.due_soon_days = due_soon_days
+
+    def overdue(self, now: datetime = None):
+        now = now or datetime.utcnow()
+        return self.loan_repo.open_loans_due_between("", now.isoformat())
+
+    def due_soon(self, now: datetime = None):
+        now = now or datetime.utcnow()
+        horizon = now + timedelta(days=self.due_soon_days)
+        return self.loan_repo.open_loans_due_between(now.isoformat(), horizon.isoformat())
+
+    def run_batch(self, handle: Callable[[str, object], None], now: datetime = None) -> dict:
+        """Pass newly overdue / due-soon loans to ``handle(kind, row)``; returns counts.
+
+        The watermark only moves after every row of a kind was handled, so a
+        crash mid-batch re-delivers that kind on the next run.
+        """
+        now = now or datetime.utcnow()
+        horizon = now + timedelta(days=self.due_soon_days)
+        counts = {}
+        for kind, until in ((self.OVERDUE, now), (self.DUE_SOON, horizon)):
+            job = f"loan_scan.{kind}"
+            # on the first run due-soon starts at "now" so already overdue
+            # loans are not also reported as due soon
+            after = self.state_repo.get(job) or ("" if kind == self.OVERDUE else now.isoformat())
+            until = until.isoformat()
+            count = 0
+            for row in self.loan_repo.open_loans_due_between(after, until):
+                handle(kind, row)
+                count += 1
+            # never move the watermark backwards (e.g. after a clock change)
+            self.state_repo.set(job, max(after, until))
+            counts[kind] = count
+        return counts
 
 
 class DatabaseInitializer:
@@ -89,41 +353,11 @@ class DatabaseInitializer:
         self.user_repo = user_repo
 
     def init(self):
-        conn = self.db.connect()
-        cur = conn.cursor()
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password_hash TEXT,
-            role TEXT,
-            created_at TEXT
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            author TEXT,
-            year INTEGER,
-            copies_total INTEGER,
-            copies_available INTEGER,
-            created_at TEXT
-        )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS loans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            book_id INTEGER,
-            loan_date TEXT,
-            due_date TEXT,
-            return_date TEXT
-        )
-        """)
-
-        conn.commit()
-        conn.close()
+        with self.db.connection() as conn:
+            migrate(conn)
+            # a bulk import killed mid-way leaves the search trigger and index
+            # dropped; checked without a write lock, repaired under one
+            suspended = abandoned_import(conn.cursor())
+        if suspended:
+            with self.db.transaction() as conn:
+                restore_suspended_indexes(conn.cursor())
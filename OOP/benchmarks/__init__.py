@@ -0,0 +1,2 @@
+"""Benchmarks and load harnesses. Run from the OOP directory, e.g.
+``python -m benchmarks.bench_http``."""
@@ -0,0 +1,153 @@
+"""Requests-per-second benchmark for the HTTP/JSON API.
+
+Without ``--url`` an in-process server is started on a temporary database
+seeded with books and users. Each client thread keeps one HTTP/1.1
+connection open and loops over a read-heavy mix (catalog pages, searches,
+single books) with an occasional borrow + return.
+
+    python -m benchmarks.bench_http --clients 8 --seconds 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from infrastructure.database import SQLiteDatabase
+from infrastructure.repositories import UserRepository, BookRepository, LoanRepository
+from application.services import AuthService, BookService, LoanService, DatabaseInitializer
+from ui.http_api import LibraryAPI, make_server
+from benchmarks.stats import summarize
+from utils import PasswordHasher
+
+WORDS = ["laut", "gunung", "kota", "hutan", "sungai", "langit", "bumi", "api"]
+
+
+def start_local_server(books: int, users: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_http_"), "bench.db")
+    db = SQLiteDatabase(path, pool_size=16)
+    hasher = PasswordHasher(workers=os.cpu_count() or 1)
+    user_repo = UserRepository(db)
+    book_repo = BookRepository(db)
+    DatabaseInitializer(db, hasher, user_repo).init()
+    rnd = random.Random(7)
+    book_repo.bulk_insert(
+        (f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS)} {i}", f"Penulis {i % 500}", 2000, 3)
+        for i in range(books)
+    )
+    auth = AuthService(user_repo, hasher)
+    for i in range(users):
+        auth.register(f"bench{i}", "rahasia")
+    api = LibraryAPI(auth, BookService(book_repo), LoanService(LoanRepository(db), book_repo))
+    server = make_server(api, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class Client:
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        self.token = None
+
+    def call(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = json.dumps(body).encode() if body is not None else None
+        self.conn.request(method, path, body=data, headers=headers)
+        resp = self.conn.getresponse()
+        payload = json.loads(resp.read() or b"null")
+        return resp.status, payload
+
+
+def run(url: str, clients: int, seconds: float, books: int):
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        rnd = random.Random(n)
+        client = Client(url)
+        status, payload = client.call("POST", "/login", {"username": f"bench{n}", "password": "rahasia"})
+        if status == 200:
+            client.token = payload["token"]
+        local = {}
+        local_errors = {}
+        while time.perf_counter() < deadline:
+            r = rnd.random()
+            if r < 0.4:
+                name, method, path, body = "page", "GET", f"/books?limit=20&cursor={rnd.randrange(books)}", None
+            elif r < 0.75:
+                name, method, path, body = "search", "GET", f"/books/search?q={rnd.choice(WORDS)}&limit=20", None
+            elif r < 0.95 or client.token is None:
+                name, method, path, body = "get", "GET", f"/books/{rnd.randrange(1, books + 1)}", None
+            else:
+                name, method, path, body = "borrow", "POST", "/loans", {"book_id": rnd.randrange(1, books + 1)}
+            t0 = time.perf_counter()
+            status, payload = client.call(method, path, body)
+            local.setdefault(name, []).append(time.perf_counter() - t0)
+            if status >= 500:
+                local_errors[name] = local_errors.get(name, 0) + 1
+            if name == "borrow" and status == 201:
+                status, payload = client.call("GET", "/loans")
+                for loan in payload.get("loans", []):
+                    t0 = time.perf_counter()
+                    client.call("POST", f"/loans/{loan['loan_id']}/return")
+                    local.setdefault("return", []).append(time.perf_counter() - t0)
+        with lock:
+            for k, v in local.items():
+                latencies.setdefault(k, []).extend(v)
+            for k, v in local_errors.items():
+                errors[k] = errors.get(k, 0) + v
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    result = {
+        "clients": clients,
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "errors": errors,
+        "endpoints": {},
+    }
+    for name, values in sorted(latencies.items()):
+        result["endpoints"][name] = summarize(values)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="server yang sudah berjalan (user bench0..N harus ada)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--books", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_local_server(args.books, args.clients)
+    try:
+        print(json.dumps(run(url, args.clients, args.seconds, args.books), indent=2))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
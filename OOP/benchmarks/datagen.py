@@ -0,0 +1,159 @@
+"""Deterministic synthetic library data for benchmarks.
+
+``generate(path, scale)`` builds a fully migrated database with ``scale``
+books, ``scale`` historic loans and ``scale // 10`` users (at least 100).
+The same scale and seed always produce the same rows. Every user's
+password is ``PASSWORD``. About 5% of loans are still active, and stock
+counts and the circulation summaries agree with them.
+
+    python -m benchmarks.datagen 100k
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from infrastructure.database import SQLiteDatabase
+from infrastructure.migrations import migrate, rebuild_circulation_stats
+from infrastructure.repositories import BookRepository
+from application.services import DatabaseInitializer
+from utils import PasswordHasher
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+PASSWORD = "rahasia"
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+_WORDS = (
+    "laut gunung kota hutan sungai langit bumi api angin hujan malam pagi "
+    "cahaya bayang rumah jalan pulau bintang bulan matahari kisah rahasia "
+    "negeri sejarah cinta perang damai ilmu seni budaya"
+).split()
+_NAMES = (
+    "Andi Budi Citra Dewi Eka Fajar Gita Hadi Intan Joko Kartika Lestari "
+    "Made Nanda Oki Putri Rahmat Sari Taufik Umar Wulan Yanti"
+).split()
+_EPOCH = datetime(2024, 1, 1)
+
+
+def scale_value(scale) -> int:
+    if isinstance(scale, int):
+        return scale
+    key = str(scale).lower()
+    if key in SCALES:
+        return SCALES[key]
+    return int(key)
+
+
+def generate(path: str, scale, seed: int = 42, progress=print) -> dict:
+    n = scale_value(scale)
+    n_users = max(n // 10, 100)
+    rnd = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    db = SQLiteDatabase(path)
+    DatabaseInitializer(db, None, None).init()
+    book_repo = BookRepository(db)
+    # one PBKDF2 for everyone; the benchmark measures verification, not setup
+    password_hash = PasswordHasher().hash(PASSWORD)
+
+    t0 = time.perf_counter()
+    book_repo.suspend_search_index()
+    conn = sqlite3.connect(path)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (id, username, password_hash, role, created_at) VALUES (?,?,?,?,?)",
+        (
+            (i, f"user{i}", password_hash, "pengunjung", _EPOCH.isoformat())
+            for i in range(1, n_users + 1)
+        ),
+    )
+
+    copies = [0] * (n + 1)
+    books = []
+    for i in range(1, n + 1):
+        copies[i] = rnd.randint(1, 5)
+        title = " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(2, 4))).capitalize()
+        author = f"{rnd.choice(_NAMES)} {rnd.choice(_NAMES)}"
+        books.append((i, f"{title} {i}", author, rnd.randint(1950, 2024), copies[i], _EPOCH.isoformat()))
+
+    active = set()
+    available = copies[:]
+    loans = []
+    span_days = 730
+    for i in range(1, n + 1):
+        user_id = rnd.randint(1, n_users)
+        book_id = rnd.randint(1, n)
+        loan_date = _EPOCH + timedelta(days=span_days * i / n, seconds=rnd.randint(0, 86399))
+        due_date = loan_date + timedelta(days=7)
+        still_out = rnd.random() < 0.05 and (user_id, book_id) not in active and available[book_id] > 0
+        if still_out:
+            active.add((user_id, book_id))
+            available[book_id] -= 1
+            return_date = None
+        else:
+            return_date = (loan_date + timedelta(days=rnd.randint(1, 14))).isoformat()
+        loans.append((i, user_id, book_id, loan_date.isoformat(), due_date.isoformat(), return_date))
+
+    conn.executemany(
+        "INSERT INTO books (id, title, author, year, copies_total, copies_available, created_at) VALUES (?,?,?,?,?,?,?)",
+        ((i, t, a, y, c, available[i], ts) for i, t, a, y, c, ts in books),
+    )
+    conn.executemany(
+        "INSERT INTO loans (id, user_id, book_id, loan_date, due_date, return_date) VALUES (?,?,?,?,?,?)",
+        loans,
+    )
+    # the v6 backfill ran on an empty loans table during init
+    rebuild_circulation_stats(conn.cursor())
+    conn.commit()
+    conn.close()
+    book_repo.rebuild_search_index()
+    conn = sqlite3.connect(path)
+    conn.execute("ANALYZE")
+    conn.close()
+
+    info = {"books": n, "users": n_users, "loans": n, "active_loans": len(active), "seed": seed}
+    if progress:
+        progress(f"{path}: {info} dalam {time.perf_counter() - t0:.1f} dtk")
+    return info
+
+
+def cached_dataset(scale, seed: int = 42) -> str:
+    """Path of a generated dataset, creating it on first use."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"library_{scale_value(scale)}_{seed}.db")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        generate(tmp, scale, seed)
+        os.replace(tmp, path)
+    else:
+        # datasets cached before a schema change are brought up to date in place
+        conn = sqlite3.connect(path)
+        try:
+            migrate(conn)
+            # datasets generated before the loans were summarized
+            if conn.execute("SELECT EXISTS(SELECT 1 FROM loans) AND NOT EXISTS(SELECT 1 FROM stats_book)").fetchone()[0]:
+                with conn:
+                    rebuild_circulation_stats(conn.cursor())
+        finally:
+            conn.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Buat dataset sintetis untuk benchmark")
+    parser.add_argument("scale", help="10k, 100k, 1m atau angka")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="path file database (default: benchmarks/.data/)")
+    args = parser.parse_args(argv)
+    if args.out:
+        generate(args.out, args.scale, args.seed)
+    else:
+        print(cached_dataset(args.scale, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Multi-process circulation load test with invariant checks.
+
+Worker processes, each with its own connection as separate app instances
+would have, fire a mix of operations at a shared temp database: single
+borrows, ``borrow_many`` stacks, returns, placing and cancelling holds, and
+hold expiry (run with a clock a month ahead, so every copy set aside is
+released down the queue). Users and books are drawn from small pools on
+purpose, so the same copy, the same (user, book) pair and the same queue
+are contended across processes. Afterwards the database is checked for:
+
+* stock: ``0 <= copies_available`` and
+  ``copies_total == copies_available + active loans + ready holds`` per book,
+* loans: no user holds two active loans of the same book, and the loan
+  rows match the borrows and returns the workers saw succeed,
+* holds: no one waits for a book with a copy on the shelf, and no open
+  hold belongs to a user who already has the book,
+* summaries: ``stats_book`` / ``stats_user`` agree with the loans table.
+
+Reported are throughput, latency percentiles per operation, and how often a
+``database is locked`` error was retried (or given up on). The script exits
+non-zero when an invariant is broken or an operation failed unexpectedly.
+
+    python -m benchmarks.load_loans --processes 8 --ops 2000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from entities import User
+from infrastructure.database import SQLiteDatabase, DB_PROFILE
+from infrastructure.repositories import BookRepository, LoanRepository, HoldRepository
+from application.services import LoanService, HoldService, DatabaseInitializer
+from benchmarks.stats import summarize
+
+LOCK_RETRIES = 5
+KINDS = ("borrow", "borrow_many", "return", "hold", "cancel", "expire")
+
+
+class LockGaveUp(Exception):
+    """Still ``database is locked`` after LOCK_RETRIES retries."""
+
+
+def _with_retry(fn, counts):
+    """Run ``fn``, retrying ``database is locked`` errors with a short backoff."""
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            if attempt == LOCK_RETRIES:
+                counts["lock_failures"] += 1
+                raise LockGaveUp() from e
+            counts["lock_retries"] += 1
+            time.sleep(0.005 * (2 ** attempt))
+
+
+def _pick_kind(rnd, args) -> str:
+    """Draw an operation kind from the ``--*-ratio`` mix; the remainder are single borrows."""
+    x = rnd.random()
+    for kind, ratio in (
+        ("return", args.return_ratio), ("borrow_many", args.batch_ratio), ("hold", args.hold_ratio),
+        ("cancel", args.cancel_ratio), ("expire", args.expire_ratio),
+    ):
+        if x < ratio:
+            return kind
+        x -= ratio
+    return "borrow"
+
+
+def worker(n, path, args, start, results):
+    db = SQLiteDatabase(path, pool_size=1, pool_timeout=30, profile=args.profile)
+    if args.busy_timeout_ms is not None:
+        db.pragmas = {**db.pragmas, "busy_timeout": args.busy_timeout_ms}
+    loans = LoanService(LoanRepository(db), BookRepository(db))
+    holds = HoldService(HoldRepository(db))
+    rnd = random.Random(n)
+    counts = {f"{kind}_{outcome}": 0 for kind in KINDS for outcome in ("ok", "rejected")}
+    counts.update(loans_created=0, holds_expired=0, lock_retries=0, lock_failures=0, errors=0)
+    latencies = {kind: [] for kind in KINDS}
+    error_samples = []
+
+    def borrow(user, book_id):
+        loans.borrow(user, book_id)
+        counts["loans_created"] += 1
+
+    def borrow_many(user, book_ids, atomic):
+        done = sum(r.ok for r in loans.borrow_many(user, book_ids, atomic))
+        counts["loans_created"] += done
+        if not done:
+            raise ValueError("Tidak ada buku yang terpinjam")
+
+    def return_one(user):
+        active = loans.active_loans_by_user(user)
+        if not active:
+            raise ValueError("Tidak ada pinjaman aktif")
+        # another process may return the same loan first
+        loans.return_book(user, rnd.choice(active).loan_id)
+
+    def cancel_one(user):
+        open_holds = holds.by_user(user)
+        if not open_holds:
+            raise ValueError("Tidak ada antrean")
+        holds.cancel(user, rnd.choice(open_holds).hold_id)
+
+    def expire():
+        counts["holds_expired"] += holds.expire(datetime.utcnow() + timedelta(days=30))
+
+    start.wait()
+    t_start = time.perf_counter()
+    for _ in range(args.ops):
+        user = User(rnd.randrange(1, args.users + 1), "", "pengunjung")
+        book_id = rnd.randrange(1, args.books + 1)
+        kind = _pick_kind(rnd, args)
+        if kind == "borrow":
+            op = lambda: borrow(user, book_id)
+        elif kind == "borrow_many":
+            stack = rnd.sample(range(1, args.books + 1), min(rnd.randint(2, 4), args.books))
+            op = lambda: borrow_many(user, stack, rnd.random() < 0.5)
+        elif kind == "return":
+            op = lambda: return_one(user)
+        elif kind == "hold":
+            op = lambda: holds.place(user, book_id)
+        elif kind == "cancel":
+            op = lambda: cancel_one(user)
+        else:
+            op = expire
+
+        t0 = time.perf_counter()
+        try:
+            _with_retry(op, counts)
+        except ValueError:
+            counts[f"{kind}_rejected"] += 1
+        except LockGaveUp:
+            pass
+        except Exception as e:
+            counts["errors"] += 1
+            if len(error_samples) < 5:
+                error_samples.append(repr(e))
+        else:
+            counts[f"{kind}_ok"] += 1
+        latencies[kind].append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - t_start
+    db.close()
+    results.put({"counts": counts, "latencies": latencies, "elapsed": elapsed, "errors": error_samples})
+
+
+def check_invariants(path: str, borrowed: int, returned: int) -> list:
+    """Return a description of every broken invariant (empty when consistent)."""
+    conn = sqlite3.connect(path)
+    problems = []
+    try:
+        for book_id, total, available, active, ready in conn.execute(
+            """
+            SELECT b.id, b.copies_total, b.copies_available,
+                   (SELECT COUNT(*) FROM loans l WHERE l.book_id=b.id AND l.return_date IS NULL),
+                   (SELECT COUNT(*) FROM holds h WHERE h.book_id=b.id AND h.status='ready')
+            FROM books b
+            """
+        ):
+            if available < 0 or total != available + active + ready:
+                problems.append(
+                    f"buku {book_id}: total={total} tersedia={available} dipinjam={active} antrean_siap={ready}"
+                )
+        for user_id, book_id, n in conn.execute(
+            """
+            SELECT user_id, book_id, COUNT(*) FROM loans WHERE return_date IS NULL
+            GROUP BY user_id, book_id HAVING COUNT(*) > 1
+            """
+        ):
+            problems.append(f"pinjaman ganda: user {user_id} buku {book_id} x{n}")
+        for (book_id,) in conn.execute(
+            """
+            SELECT b.id FROM books b
+            WHERE b.copies_available > 0
+              AND EXISTS (SELECT 1 FROM holds h WHERE h.book_id=b.id AND h.status='waiting')
+            """
+        ):
+            problems.append(f"buku {book_id}: ada eksemplar di rak, tetapi antrean masih menunggu")
+        for user_id, book_id in conn.execute(
+            """
+            SELECT h.user_id, h.book_id FROM holds h
+            JOIN loans l ON l.user_id=h.user_id AND l.book_id=h.book_id AND l.return_date IS NULL
+            WHERE h.status IN ('waiting', 'ready')
+            """
+        ):
+            problems.append(f"antrean terbuka user {user_id} buku {book_id} padahal bukunya sedang dipinjam")
+        loans_total, returned_total = conn.execute(
+            "SELECT COUNT(*), COUNT(return_date) FROM loans"
+        ).fetchone()
+        if loans_total != borrowed:
+            problems.append(f"{loans_total} baris pinjaman, tetapi {borrowed} peminjaman berhasil")
+        if returned_total != returned:
+            problems.append(f"{returned_total} pinjaman kembali, tetapi {returned} pengembalian berhasil")
+        for table, key in (("stats_book", "book_id"), ("stats_user", "user_id")):
+            for row in conn.execute(
+                f"""
+                SELECT s.{key} FROM {table} s
+                LEFT JOIN (
+                    SELECT {key}, COUNT(*) AS total, COUNT(*) - COUNT(return_date) AS active
+                    FROM loans GROUP BY {key}
+                ) l ON l.{key} = s.{key}
+                WHERE s.loans_total != COALESCE(l.total, 0) OR s.active_loans != COALESCE(l.active, 0)
+                """
+            ):
+                problems.append(f"{table}: ringkasan {key}={row[0]} tidak cocok dengan tabel loans")
+    finally:
+        conn.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=1000, help="operasi per proses")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--books", type=int, default=30)
+    parser.add_argument("--copies", type=int, default=2, help="eksemplar per buku")
+    parser.add_argument("--return-ratio", type=float, default=0.35)
+    parser.add_argument("--batch-ratio", type=float, default=0.1, help="porsi borrow_many")
+    parser.add_argument("--hold-ratio", type=float, default=0.15)
+    parser.add_argument("--cancel-ratio", type=float, default=0.05)
+    parser.add_argument("--expire-ratio", type=float, default=0.01)
+    parser.add_argument("--profile", default=DB_PROFILE, choices=("safe", "performance"))
+    parser.add_argument(
+        "--busy-timeout-ms", type=int,
+        help="timpa busy_timeout profil (nilai kecil membuat error 'database is locked' lebih sering)",
+    )
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="load_loans_"), "load.db")
+    db = SQLiteDatabase(path, profile=args.profile)
+    DatabaseInitializer(db, None, None).init()
+    BookRepository(db).bulk_insert((f"Buku {i}", f"Penulis {i}", 2000, args.copies) for i in range(args.books))
+
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=worker, args=(n, path, args, start, results))
+        for n in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    t0 = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in procs]
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+
+    counts = {}
+    latencies = {kind: [] for kind in KINDS}
+    errors = []
+    for outcome in outcomes:
+        for key, value in outcome["counts"].items():
+            counts[key] = counts.get(key, 0) + value
+        for kind, values in outcome["latencies"].items():
+            latencies[kind].extend(values)
+        errors.extend(outcome["errors"])
+    total_ops = args.processes * args.ops
+    problems = check_invariants(path, counts["loans_created"], counts["return_ok"])
+
+    print(json.dumps(
+        {
+            "processes": args.processes,
+            "profile": args.profile,
+            "operations": total_ops,
+            "ops_per_s": round(total_ops / wall, 1),
+            "counts": counts,
+            "latency": {kind: summarize(values) for kind, values in latencies.items() if values},
+            "all": summarize([t for values in latencies.values() for t in values]),
+            "error_samples": errors,
+            "invariant_violations": problems,
+        },
+        indent=2,
+    ))
+    if problems or counts["errors"]:
+        print(
+            f"GAGAL: {len(problems)} pelanggaran invarian, {counts['errors']} operasi gagal tak terduga",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
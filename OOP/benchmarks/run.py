@@ -0,0 +1,170 @@
+"""Timed scenarios for repositories and services against synthetic data.
+
+    python -m benchmarks.run --scale 100k --out hasil.json
+    python -m benchmarks.run --scale 100k --baseline hasil.json
+
+Each run works on a fresh copy of the cached dataset (see datagen.py), so
+borrow/return scenarios never change the baseline data. With
+``--baseline`` every scenario's p50 and p99 are compared with the saved run.
+The exit status is 1 when any of them is slower by more than ``--tolerance``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from entities import User
+from infrastructure.database import SQLiteDatabase, DB_PROFILE
+from infrastructure.repositories import UserRepository, BookRepository, LoanRepository
+from application.services import AuthService, BookService, LoanService
+from utils import PasswordHasher
+from benchmarks.datagen import cached_dataset, scale_value, PASSWORD, _WORDS
+from benchmarks.stats import summarize
+
+SCENARIOS = ("list", "search", "borrow", "return", "history", "login")
+DEFAULT_ITERATIONS = {"login": 30}
+
+
+class Bench:
+    def __init__(self, path: str, seed: int, profile: str):
+        self.db = SQLiteDatabase(path, pool_size=1, profile=profile)
+        conn = sqlite3.connect(path)
+        self.n_books = conn.execute("SELECT MAX(id) FROM books").fetchone()[0]
+        self.n_users = conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+        conn.close()
+        self.rnd = random.Random(seed)
+        book_repo = BookRepository(self.db)
+        self.auth = AuthService(UserRepository(self.db), PasswordHasher())
+        self.books = BookService(book_repo)
+        self.loans = LoanService(LoanRepository(self.db), book_repo)
+        self._borrowed = []
+
+    def _user(self):
+        uid = self.rnd.randint(1, self.n_users)
+        return User(uid, f"user{uid}", "pengunjung")
+
+    def op_list(self):
+        self.books.page(str(self.rnd.randrange(self.n_books)))
+
+    def op_search(self):
+        self.books.search(" ".join(self.rnd.sample(_WORDS, self.rnd.randint(1, 2))), 20)
+
+    def op_borrow(self):
+        user = self._user()
+        try:
+            self.loans.borrow(user, self.rnd.randint(1, self.n_books))
+        except ValueError:
+            return
+        self._borrowed.append(user)
+
+    def op_return(self):
+        if not self._borrowed:
+            self.op_borrow()
+            return
+        user = self._borrowed.pop()
+        for row in self.loans.active_loans_by_user(user)[:1]:
+            self.loans.return_book(user, row.loan_id)
+
+    def op_history(self):
+        self.loans.history_page(self._user())
+
+    def op_login(self):
+        if not self.auth.login(f"user{self.rnd.randint(1, self.n_users)}", PASSWORD):
+            raise RuntimeError("login benchmark gagal: password dataset tidak cocok")
+
+    def run(self, scenario: str, iterations: int, warmup: int) -> dict:
+        op = getattr(self, f"op_{scenario}")
+        if scenario == "return":
+            # give the return scenario loans of its own to hand back
+            for _ in range(iterations + warmup):
+                self.op_borrow()
+        for _ in range(warmup):
+            op()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            op()
+            latencies.append(time.perf_counter() - t0)
+        return summarize(latencies, time.perf_counter() - start)
+
+
+def compare(current: dict, baseline: dict, tolerance: float):
+    """Yield ``(scenario, metric, baseline_ms, current_ms, ratio, regressed)``."""
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if not before[metric]:
+                continue
+            ratio = now[metric] / before[metric]
+            yield name, metric, before[metric], now[metric], round(ratio, 3), ratio > 1 + tolerance
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark repository & service")
+    parser.add_argument("--scale", default="10k", help="10k, 100k, 1m atau angka")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--profile", default=DB_PROFILE)
+    parser.add_argument("--out", help="simpan hasil JSON ke file ini")
+    parser.add_argument("--baseline", help="file JSON hasil sebelumnya untuk dibandingkan")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="regresi yang masih diterima (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    source = cached_dataset(args.scale, args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    path = os.path.join(workdir, "bench.db")
+    shutil.copyfile(source, path)
+    try:
+        bench = Bench(path, args.seed, args.profile)
+        scenarios = {}
+        for name in args.scenarios.split(","):
+            name = name.strip()
+            if name not in SCENARIOS:
+                parser.error(f"skenario tidak dikenal: {name}")
+            iterations = min(args.iterations, DEFAULT_ITERATIONS.get(name, args.iterations))
+            scenarios[name] = bench.run(name, iterations, min(args.warmup, iterations))
+        bench.db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "scale": scale_value(args.scale),
+        "seed": args.seed,
+        "profile": args.profile,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": scenarios,
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"\n{'skenario':<10} {'metrik':<7} {'baseline':>10} {'sekarang':>10} {'rasio':>7}")
+        for name, metric, before, now, ratio, regressed in compare(result, baseline, args.tolerance):
+            flag = "  REGRESI" if regressed else ""
+            regressions += regressed
+            print(f"{name:<10} {metric:<7} {before:>10.3f} {now:>10.3f} {ratio:>7.3f}{flag}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Startup-time benchmark with an import budget for main.py.
+
+Each run starts a fresh interpreter that does what ``python main.py`` does
+up to the menu: import main, build the services against an already
+migrated database and import the CLI. Reported per run are the wall time of
+the whole process (interpreter start included) and the application's
+import time, taken from ``-X importtime`` minus what a bare interpreter
+imports. The script exits non-zero when the median import time is above
+``--budget-ms`` and lists the slowest modules, i.e. what to make lazy next.
+
+    python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+
+from infrastructure.migrations import migrate
+from benchmarks.stats import summarize
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = (
+    "import sys, main\n"
+    "main.build(main.build_parser().parse_args([]), db_path=sys.argv[1])\n"
+    "import ui.cli\n"
+)
+BUDGET_MS = 120.0
+
+
+def parse_importtime(stderr: str):
+    """Return ``(total_us, {module: self_us})`` from ``-X importtime`` output."""
+    total = 0
+    self_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        self_times[module] = self_times.get(module, 0) + int(self_us)
+        # top-level entries (no indentation) already include their children
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us)
+    return total, self_times
+
+
+def run_once(code: str, *args):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return wall, parse_importtime(proc.stderr)
+
+
+def time_migrate(path: str) -> float:
+    conn = sqlite3.connect(path)
+    try:
+        start = time.perf_counter()
+        migrate(conn)
+        return (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="batas waktu impor aplikasi (median)")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="startup_"), "startup.db")
+    fresh_ms = time_migrate(path)
+    current_ms = time_migrate(path)
+
+    # warm-up: writes .pyc files so later runs measure a normal start
+    run_once(PROBE, path)
+    baseline_us, baseline_modules = run_once("pass")[1]
+
+    walls = []
+    imports = []
+    self_times = {}
+    for _ in range(args.runs):
+        wall, (total_us, modules) = run_once(PROBE, path)
+        walls.append(wall)
+        imports.append((total_us - baseline_us) / 1000)
+        for module, us in modules.items():
+            if module not in baseline_modules:
+                self_times[module] = self_times.get(module, 0) + us
+
+    import_ms = round(median(imports), 1)
+    slowest = sorted(self_times.items(), key=lambda item: -item[1])[:10]
+    print(json.dumps(
+        {
+            "runs": args.runs,
+            "process": summarize(walls),
+            "import_ms": import_ms,
+            "budget_ms": args.budget_ms,
+            "migrate_fresh_ms": round(fresh_ms, 2),
+            "migrate_current_ms": round(current_ms, 3),
+            "slowest_modules_ms": {m: round(us / args.runs / 1000, 2) for m, us in slowest},
+        },
+        indent=2,
+    ))
+    if import_ms > args.budget_ms:
+        print(f"GAGAL: waktu impor {import_ms} ms > {args.budget_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
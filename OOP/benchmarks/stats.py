@@ -0,0 +1,25 @@
+"""Latency summaries shared by the benchmarks."""
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(latencies, elapsed: float = None) -> dict:
+    """Summarize a list of latencies in seconds as milliseconds."""
+    values = sorted(latencies)
+    result = {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p90_ms": round(percentile(values, 90) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+    if elapsed:
+        result["ops_per_s"] = round(len(values) / elapsed, 1)
+    return result
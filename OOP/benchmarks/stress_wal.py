@@ -0,0 +1,136 @@
+"""Reader-stall stress test: read latency while writers commit in bursts.
+
+Writer threads hammer borrow/return transactions while reader threads time
+catalog reads. The run is repeated for each PRAGMA profile, then for the
+performance profile with group commit, alone and with catalog reads routed
+to read-only connections or a snapshot copy (ReadRoutingDatabase). With the
+rollback journal ("safe") readers are blocked while a writer commits; with
+WAL they should not be.
+The script exits non-zero if the performance profile's worst read is above
+``--max-read-ms``.
+
+    python -m benchmarks.stress_wal --seconds 5
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from entities import User, Loan
+from infrastructure.database import SQLiteDatabase, ReadRoutingDatabase, GroupCommitWriter
+from infrastructure.repositories import BookRepository, LoanRepository
+from application.services import DatabaseInitializer
+from benchmarks.stats import percentile
+
+
+SNAPSHOT_INTERVAL = 1.0
+
+
+def run_profile(profile: str, seconds: float, writers: int, readers: int, books: int, group_commit: bool,
+                reads: str = "primary"):
+    path = os.path.join(tempfile.mkdtemp(prefix="stress_wal_"), "stress.db")
+    db = SQLiteDatabase(path, pool_size=writers + readers + 1, pool_timeout=30, profile=profile)
+    if reads != "primary":
+        db = ReadRoutingDatabase(db, readers, SNAPSHOT_INTERVAL if reads == "snapshot" else None)
+    DatabaseInitializer(db, None, None).init()
+    book_repo = BookRepository(db)
+    book_repo.bulk_insert((f"Buku {i}", f"Penulis {i % 100}", 2000, 5) for i in range(books))
+    writer = GroupCommitWriter(db) if group_commit else None
+    loan_repo = LoanRepository(db, writer=writer)
+
+    stop = threading.Event()
+    read_latencies = []
+    write_latencies = []
+    lock = threading.Lock()
+
+    def write_loop(n):
+        rnd = random.Random(n)
+        user = User(n + 1, f"w{n}", "pengunjung")
+        local = []
+        while not stop.is_set():
+            book_id = rnd.randrange(1, books + 1)
+            t0 = time.perf_counter()
+            try:
+                loan_repo.create_loan_and_decrease_stock(Loan.create(user.id, book_id))
+            except ValueError:
+                pass
+            else:
+                active = loan_repo.active_loans_by_user(user.id)
+                loan_repo.return_loans([r.loan_id for r in active], user.id)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            write_latencies.extend(local)
+
+    def read_loop(n):
+        rnd = random.Random(1000 + n)
+        local = []
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            book_repo.list_page(rnd.randrange(books), 20)
+            book_repo.get_by_id(rnd.randrange(1, books + 1))
+            local.append(time.perf_counter() - t0)
+        with lock:
+            read_latencies.extend(local)
+
+    threads = [threading.Thread(target=write_loop, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    if writer is not None:
+        writer.close()
+    db.close()
+
+    read_latencies.sort()
+    write_latencies.sort()
+    return {
+        "profile": " + ".join(
+            [profile] + (["group commit"] if group_commit else []) + ([f"{reads} reads"] if reads != "primary" else [])
+        ),
+        "reads": len(read_latencies),
+        "read_p50_ms": round(percentile(read_latencies, 50) * 1000, 3),
+        "read_p99_ms": round(percentile(read_latencies, 99) * 1000, 3),
+        "read_max_ms": round(read_latencies[-1] * 1000, 3) if read_latencies else 0.0,
+        "write_cycles": len(write_latencies),
+        "write_p99_ms": round(percentile(write_latencies, 99) * 1000, 3),
+        "group_commit_batches": writer.batches if writer else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--max-read-ms", type=float, default=250.0)
+    args = parser.parse_args(argv)
+
+    results = [
+        run_profile(profile, args.seconds, args.writers, args.readers, args.books, group_commit, reads)
+        for profile, group_commit, reads in (
+            ("safe", False, "primary"),
+            ("performance", False, "primary"),
+            ("performance", True, "primary"),
+            ("performance", True, "read-only"),
+            ("performance", True, "snapshot"),
+        )
+    ]
+    print(json.dumps(results, indent=2))
+    worst = max(r["read_max_ms"] for r in results if r["profile"].startswith("performance"))
+    if worst > args.max_read_ms:
+        print(f"GAGAL: pembacaan terlama {worst} ms > {args.max_read_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
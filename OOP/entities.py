@@ -1,38 +1,130 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Optional
 
+# Repositories build these positionally from rows whose SELECT lists follow
+# the field order below (see infrastructure/repositories.py), so keep the
+# two in step when adding fields.
 
+
+@dataclass(slots=True)
 class User:
-    def __init__(self, id: int, username: str, role: str):
-        self.id = id
-        self.username = username
-        self.role = role
+    id: int
+    username: str
+    role: str
+    created_at: Optional[str] = None
+    # only loaded for login; never kept in sessions
+    password_hash: Optional[str] = None
 
     def is_admin(self) -> bool:
         return self.role == "admin"
 
 
+@dataclass(slots=True)
 class Book:
-    def __init__(self, id, title, author, year, total, available):
-        self.id = id
-        self.title = title
-        self.author = author
-        self.year = year
-        self.total = total
-        self.available = available
+    id: int
+    title: str
+    author: str
+    year: Optional[int]
+    copies_total: int
+    copies_available: int
+    created_at: Optional[str] = None
 
     def can_be_borrowed(self) -> bool:
-        return self.available > 0
+        return self.copies_available > 0
 
 
+@dataclass(slots=True)
 class Loan:
+    user_id: int
+    book_id: int
+    loan_date: str
+    due_date: str
+    return_date: Optional[str] = None
+    id: Optional[int] = None
+
     LOAN_DAYS = 7
 
     @staticmethod
-    def create(user_id: int, book_id: int) -> dict:
+    def create(user_id: int, book_id: int) -> "Loan":
         now = datetime.utcnow()
-        return {
-            "user_id": user_id,
-            "book_id": book_id,
-            "loan_date": now.isoformat(),
-            "due_date": (now + timedelta(days=Loan.LOAN_DAYS)).isoformat(),
-        }
+        return Loan(user_id, book_id, now.isoformat(), (now + timedelta(days=Loan.LOAN_DAYS)).isoformat())
+
+
+@dataclass(slots=True)
+class BorrowResult:
+    """Outcome for one book of a multi-book checkout."""
+
+    book_id: int
+    ok: bool
+    error: Optional[str] = None
+
+
+@dataclass(slots=True)
+class LoanDetail:
+    """A loan joined with its book (and, for admin scans, its borrower)."""
+
+    loan_id: int
+    book_id: int
+    title: str
+    author: str
+    loan_date: str
+    due_date: str
+    return_date: Optional[str] = None
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+
+
+@dataclass(slots=True)
+class BookStats:
+    id: int
+    title: str
+    author: str
+    copies_total: int
+    loans_total: int
+    active_loans: int
+    last_loan_date: Optional[str] = None
+
+    @property
+    def utilization(self) -> float:
+        """Share of the copies currently lent out."""
+        return self.active_loans / self.copies_total if self.copies_total else 0.0
+
+
+@dataclass(slots=True)
+class UserStats:
+    id: int
+    username: str
+    loans_total: int
+    active_loans: int
+    last_loan_date: Optional[str] = None
+
+
+@dataclass(slots=True)
+class DailyStats:
+    day: str
+    loans: int
+    returns: int
+
+
+@dataclass(slots=True)
+class Hold:
+    """A user's place in the FIFO reservation queue of one book."""
+
+    hold_id: int
+    book_id: int
+    title: str
+    author: str
+    status: str
+    created_at: str
+    expires_at: Optional[str] = None
+    # 1-based place in the queue while waiting
+    position: Optional[int] = None
+
+    WAITING = "waiting"
+    READY = "ready"
+    CLAIMED = "claimed"
+    EXPIRED = "expired"
+    CANCELLED = "cancelled"
+    # how long a copy set aside for the next holder waits to be borrowed
+    READY_DAYS = 3
@@ -5,3 +5,9 @@ class UsernameAlreadyExists(Exception):
     """Raised when attempting to create a user with a username that already exists."""
 
     pass
+
+
+class DatabaseBusy(RuntimeError):
+    """Raised when no pooled database connection becomes free in time."""
+
+    pass
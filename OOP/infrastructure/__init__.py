@@ -1,16 +1,34 @@
-"""Infrastructure layer: database & repositories."""
+"""Infrastructure layer: database & repositories.
 
-from infrastructure.database import Database, SQLiteDatabase
-from infrastructure.repositories import (
-    UserRepository,
-    BookRepository,
-    LoanRepository,
-)
+Names are imported on first access (PEP 562), so importing one submodule,
+as main.py does, does not also load asyncio and every repository.
+"""
 
-__all__ = [
-    "Database",
-    "SQLiteDatabase",
-    "UserRepository",
-    "BookRepository",
-    "LoanRepository",
-]
+import importlib
+
+_EXPORTS = {
+    "Database": "infrastructure.database",
+    "SQLiteDatabase": "infrastructure.database",
+    "ReadRoutingDatabase": "infrastructure.database",
+    "UserRepository": "infrastructure.repositories",
+    "BookRepository": "infrastructure.repositories",
+    "LoanRepository": "infrastructure.repositories",
+    "HoldRepository": "infrastructure.repositories",
+    "ReportRepository": "infrastructure.repositories",
+    "JobStateRepository": "infrastructure.repositories",
+    "SQLiteExecutor": "infrastructure.async_repositories",
+    "AsyncUserRepository": "infrastructure.async_repositories",
+    "AsyncBookRepository": "infrastructure.async_repositories",
+    "AsyncLoanRepository": "infrastructure.async_repositories",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,108 @@
+"""Asyncio adapters that run the blocking SQLite repositories off the event loop.
+
+Reads go to a small pool of threads; every write goes through a single
+writer thread, so writes reach SQLite one at a time in submission order and
+never contend for the database lock with each other.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from entities import Loan
+from ports import UserRepositoryPort, BookRepositoryPort, LoanRepositoryPort
+
+
+class SQLiteExecutor:
+    def __init__(self, readers: int = 4):
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="sqlite-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-write")
+
+    async def read(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(fn, *args))
+
+    async def write(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(fn, *args))
+
+    def shutdown(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
+
+class AsyncUserRepository:
+    def __init__(self, repo: UserRepositoryPort, executor: SQLiteExecutor):
+        self.repo = repo
+        self.executor = executor
+
+    async def find_by_username(self, username: str):
+        return await self.executor.read(self.repo.find_by_username, username)
+
+    async def create(self, username: str, password_hash: str, role: str):
+        await self.executor.write(self.repo.create, username, password_hash, role)
+
+    async def promote_or_upsert_admin(self, username: str, password_hash: str):
+        await self.executor.write(self.repo.promote_or_upsert_admin, username, password_hash)
+
+    async def update_password_hash(self, user_id: int, password_hash: str):
+        await self.executor.write(self.repo.update_password_hash, user_id, password_hash)
+
+    async def list_all(self):
+        return await self.executor.read(self.repo.list_all)
+
+
+class AsyncBookRepository:
+    def __init__(self, repo: BookRepositoryPort, executor: SQLiteExecutor):
+        self.repo = repo
+        self.executor = executor
+
+    async def list_all(self):
+        return await self.executor.read(self.repo.list_all)
+
+    async def list_available(self):
+        return await self.executor.read(self.repo.list_available)
+
+    async def list_page(self, after_id: int = 0, limit: int = 20, available_only: bool = False):
+        return await self.executor.read(self.repo.list_page, after_id, limit, available_only)
+
+    async def search(self, q: str, limit: int = 50):
+        return await self.executor.read(self.repo.search, q, limit)
+
+    async def add(self, title, author, year, copies):
+        await self.executor.write(self.repo.add, title, author, year, copies)
+
+    async def get_by_id(self, book_id: int):
+        return await self.executor.read(self.repo.get_by_id, book_id)
+
+    async def update_stock(self, book_id: int, new_total: int):
+        await self.executor.write(self.repo.update_stock, book_id, new_total)
+
+    async def delete(self, book_id: int):
+        await self.executor.write(self.repo.delete, book_id)
+
+
+class AsyncLoanRepository:
+    def __init__(self, repo: LoanRepositoryPort, executor: SQLiteExecutor):
+        self.repo = repo
+        self.executor = executor
+
+    async def create_loan_and_decrease_stock(self, loan: Loan):
+        await self.executor.write(self.repo.create_loan_and_decrease_stock, loan)
+
+    async def create_loans(self, user_id: int, book_ids, loan_date: str, due_date: str, atomic: bool = True):
+        return await self.executor.write(
+            self.repo.create_loans, user_id, list(book_ids), loan_date, due_date, atomic
+        )
+
+    async def return_loan(self, loan_id: int, user_id: int):
+        await self.executor.write(self.repo.return_loan, loan_id, user_id)
+
+    async def return_loans(self, loan_ids, user_id: int):
+        return await self.executor.write(self.repo.return_loans, list(loan_ids), user_id)
+
+    async def active_loans_by_user(self, user_id: int):
+        return await self.executor.read(self.repo.active_loans_by_user, user_id)
+
+    async def history_by_user(self, user_id: int, before_id: int = None, limit: int = 20, archived: bool = False):
+        return await self.executor.read(self.repo.history_by_user, user_id, before_id, limit, archived)
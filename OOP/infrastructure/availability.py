@@ -0,0 +1,214 @@
+"""In-process index of available copies per book, kept in step with stock changes."""
+
+import logging
+import threading
+from array import array
+from itertools import compress
+
+from infrastructure import queries
+from infrastructure.database import Database
+
+log = logging.getLogger("perpustakaan.availability")
+
+_NO_BOOK = -1
+
+
+class AvailabilityIndex:
+    """``copies_available`` of every book in an ``array`` indexed by book id.
+
+    One 4-byte slot per id (``-1`` for ids without a book), so a million
+    books take ~4 MB and "is it available?" / "which ids are available?" are
+    answered without touching SQLite. ``load()`` reads the whole table once;
+    after that ``refresh`` keeps the index coherent. It is registered as a
+    stock listener on the book, loan and hold repositories and re-reads the
+    changed ids after each commit.
+
+    The re-read runs outside the index lock, so concurrent writers do not
+    queue behind each other's SELECT. Each refresh takes a ticket per id
+    first; a result is only applied if no later refresh of that id started
+    meanwhile (the later one read data at least as new). Ids whose re-read
+    failed are kept as dirty and included in the next refresh and verify.
+
+    The index answers display questions only. Borrowing still checks stock
+    inside its own transaction, because a copy set aside for a ready hold
+    counts as unavailable here.
+    """
+
+    def __init__(self, db: Database, batch_size: int = 10000):
+        self.db = db
+        self.batch_size = batch_size
+        self._counts = array("i")
+        self._lock = threading.Lock()
+        self._ticket = 0
+        self._pending = {}  # book id -> ticket of the newest refresh reading it
+        self._dirty = set()
+        self.refreshes = 0
+
+    def load(self):
+        """Rebuild the index from the books table."""
+        counts = array("i")
+        # refreshes wait for the scan, so none is overwritten by older data
+        with self._lock:
+            with self.db.connection() as conn:
+                for book_id, available in conn.execute("SELECT id, copies_available FROM books ORDER BY id"):
+                    if book_id >= len(counts):
+                        counts.extend([_NO_BOOK] * (book_id + 1 - len(counts)))
+                    counts[book_id] = max(available or 0, 0)
+            self._counts = counts
+            # refreshes that read before the scan must not overwrite it
+            self._pending.clear()
+            self._dirty.clear()
+
+    def refresh(self, book_ids=None):
+        """Re-read ``book_ids`` (an iterable of ids) from the database; ``None`` reloads everything.
+
+        A ``range`` (the ids of one bulk insert) is read with a single
+        ``BETWEEN`` instead of an id list.
+        """
+        if book_ids is None:
+            self.load()
+            return
+        with self._lock:
+            if self._dirty:
+                book_ids = sorted(self._dirty.union(book_ids))
+                self._dirty.clear()
+            elif not isinstance(book_ids, range):
+                book_ids = list(book_ids)
+            if not book_ids:
+                return
+            self._ticket += 1
+            ticket = self._ticket
+            for book_id in book_ids:
+                self._pending[book_id] = ticket
+        try:
+            found = self._read(book_ids)
+        except BaseException:
+            with self._lock:
+                for book_id in book_ids:
+                    if self._pending.get(book_id) == ticket:
+                        del self._pending[book_id]
+                        self._dirty.add(book_id)
+            raise
+        with self._lock:
+            for book_id in book_ids:
+                if self._pending.get(book_id) == ticket:
+                    del self._pending[book_id]
+                    self._set(book_id, found.get(book_id))
+            self.refreshes += 1
+
+    def _read(self, book_ids) -> dict:
+        with self.db.connection() as conn:
+            if isinstance(book_ids, range) and book_ids.step == 1:
+                return dict(
+                    conn.execute(
+                        "SELECT id, copies_available FROM books WHERE id BETWEEN ? AND ?",
+                        (book_ids.start, book_ids.stop - 1),
+                    ).fetchall()
+                )
+            found = {}
+            # stay under SQLite's bound-parameter limit
+            for start in range(0, len(book_ids), 500):
+                chunk = book_ids[start:start + 500]
+                found.update(
+                    conn.execute(
+                        queries.BOOK_STOCK_IN.format(marks=queries.in_marks(len(chunk))),
+                        chunk,
+                    ).fetchall()
+                )
+            return found
+
+    def _set(self, book_id: int, available):
+        counts = self._counts
+        if book_id >= len(counts):
+            if available is None:
+                return
+            counts.extend([_NO_BOOK] * (book_id + 1 - len(counts)))
+        counts[book_id] = _NO_BOOK if available is None else max(available, 0)
+
+    # queries
+
+    def available(self, book_id: int):
+        """Available copies of ``book_id``, or None when there is no such book."""
+        counts = self._counts
+        if not 0 < book_id < len(counts):
+            return None
+        value = counts[book_id]
+        return None if value == _NO_BOOK else value
+
+    def is_available(self, book_id: int) -> bool:
+        return (self.available(book_id) or 0) > 0
+
+    def available_ids(self, after_id: int = 0, limit: int = None):
+        """Ids with at least one copy on the shelf, ascending, starting after ``after_id``."""
+        with self._lock:
+            counts = self._counts
+            start = max(after_id + 1, 0)
+            ids = compress(range(start, len(counts)), (n > 0 for n in counts[start:]))
+            if limit is None:
+                return list(ids)
+            return [book_id for book_id, _ in zip(ids, range(limit))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = self._counts
+            books = len(counts) - counts.count(_NO_BOOK)
+            return {
+                "books": books,
+                "available_books": books - counts.count(0),
+                "bytes": counts.itemsize * len(counts),
+                "refreshes": self.refreshes,
+                "dirty": len(self._dirty),
+            }
+
+    # verification
+
+    def verify(self, repair: bool = False):
+        """Compare the index with the books table; returns ``[(book_id, indexed, actual)]``.
+
+        The table is scanned in id batches without blocking refreshes; every
+        difference found is then re-read under the lock, so a change that
+        was only in flight during the scan is not reported. Dirty ids are
+        always re-checked. ``actual`` is None for a book that no longer
+        exists. With ``repair`` the index takes the database value.
+        """
+        suspects = []
+        after = 0
+        seen_up_to = 0
+        while True:
+            with self.db.connection() as conn:
+                rows = conn.execute(
+                    queries.BOOK_STOCK_AFTER,
+                    (after, self.batch_size),
+                ).fetchall()
+            for book_id, available in rows:
+                # ids skipped since the previous row must be absent from the index
+                for missing in range(seen_up_to + 1, book_id):
+                    if self.available(missing) is not None:
+                        suspects.append(missing)
+                if self.available(book_id) != max(available or 0, 0):
+                    suspects.append(book_id)
+                seen_up_to = book_id
+            if len(rows) < self.batch_size:
+                break
+            after = rows[-1][0]
+        with self._lock:
+            suspects.extend(i for i in range(seen_up_to + 1, len(self._counts)) if self._counts[i] != _NO_BOOK)
+            suspects.extend(self._dirty.difference(suspects))
+
+        mismatches = []
+        for start in range(0, len(suspects), 500):
+            chunk = suspects[start:start + 500]
+            with self._lock:
+                found = self._read(chunk)
+                for book_id in chunk:
+                    actual = found.get(book_id)
+                    actual = None if actual is None else max(actual, 0)
+                    indexed = self.available(book_id)
+                    if indexed != actual:
+                        mismatches.append((book_id, indexed, actual))
+                        if repair:
+                            self._set(book_id, actual)
+                            self._dirty.discard(book_id)
+        if mismatches:
+            log.warning("availability index: %d mismatches%s", len(mismatches), " (repaired)" if repair else "")
+        return mismatches
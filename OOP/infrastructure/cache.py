@@ -0,0 +1,190 @@
+"""Read-through cache in front of a BookRepositoryPort."""
+
+import threading
+import time
+from collections import OrderedDict
+
+from ports import BookRepositoryPort
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by entry count and per-entry age.
+
+    ``generation`` is bumped by every ``pop`` and ``clear``. A reader that
+    loads a value on a miss passes the generation it saw before loading to
+    ``put``, which drops the value if an invalidation happened meanwhile,
+    since the load may have read data from before that change.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return _MISSING
+            expires, value = item
+            if expires < now:
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CachedBookRepository:
+    """BookRepositoryPort decorator that caches reads and invalidates on writes.
+
+    Single books are cached by id; listings, pages and search results share a
+    second cache that is dropped on any stock or catalog change, since one
+    change can move a book in or out of many of them. Stock changes made by
+    the loan repository reach the cache through ``invalidate``, which is
+    registered as a stock listener in main.py.
+
+    When reads come from a periodically refreshed snapshot, an invalidation
+    is not enough: the next load may still see the old snapshot. Pass the
+    snapshot's ``source_version`` callable and everything is dropped
+    whenever it changes.
+    """
+
+    def __init__(self, inner: BookRepositoryPort, maxsize: int = 2048, ttl: float = 30.0, source_version=None):
+        self.inner = inner
+        self._books = LRUCache(maxsize, ttl)
+        self._lists = LRUCache(max(maxsize // 8, 16), ttl)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self.source_version = source_version
+        self._source_seen = None
+
+    def _cached(self, cache: LRUCache, key, load):
+        if self.source_version is not None:
+            version = self.source_version()
+            if version != self._source_seen:
+                self._source_seen = version
+                self.invalidate()
+        value = cache.get(key)
+        if value is not _MISSING:
+            with self._stats_lock:
+                self.hits += 1
+            return value
+        with self._stats_lock:
+            self.misses += 1
+        # read before loading: an invalidation during the load discards the result
+        generation = cache.generation
+        value = load()
+        cache.put(key, value, generation)
+        return value
+
+    def invalidate(self, book_ids=None):
+        """Forget cached data for ``book_ids`` (an id or iterable of ids), or everything."""
+        self._lists.clear()
+        if book_ids is None:
+            self._books.clear()
+            return
+        if isinstance(book_ids, int):
+            book_ids = (book_ids,)
+        for book_id in book_ids:
+            self._books.pop(book_id)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "books_cached": len(self._books),
+            "lists_cached": len(self._lists),
+        }
+
+    # reads
+
+    def list_all(self):
+        return self._cached(self._lists, ("all",), self.inner.list_all)
+
+    def list_available(self):
+        return self._cached(self._lists, ("available",), self.inner.list_available)
+
+    def list_page(self, after_id: int = 0, limit: int = 20, available_only: bool = False):
+        return self._cached(
+            self._lists,
+            ("page", after_id, limit, available_only),
+            lambda: self.inner.list_page(after_id, limit, available_only),
+        )
+
+    def search(self, q: str, limit: int = 50):
+        return self._cached(self._lists, ("search", q, limit), lambda: self.inner.search(q, limit))
+
+    def get_by_id(self, book_id: int):
+        return self._cached(self._books, book_id, lambda: self.inner.get_by_id(book_id))
+
+    def import_position(self, source: str) -> int:
+        return self.inner.import_position(source)
+
+    # writes
+
+    def add(self, title, author, year, copies):
+        self.inner.add(title, author, year, copies)
+        self.invalidate(())
+
+    def bulk_insert(self, records, source: str = None, position: int = 0) -> int:
+        inserted = self.inner.bulk_insert(records, source, position)
+        self.invalidate(())
+        return inserted
+
+    def decrease_stock(self, book_id: int):
+        self.inner.decrease_stock(book_id)
+        self.invalidate(book_id)
+
+    def increase_stock(self, book_id: int):
+        self.inner.increase_stock(book_id)
+        self.invalidate(book_id)
+
+    def update_stock(self, book_id: int, new_total: int):
+        self.inner.update_stock(book_id, new_total)
+        self.invalidate(book_id)
+
+    def delete(self, book_id: int):
+        self.inner.delete(book_id)
+        self.invalidate(book_id)
+
+    def clear_import_position(self, source: str):
+        self.inner.clear_import_position(source)
+
+    def suspend_search_index(self):
+        self.inner.suspend_search_index()
+
+    def rebuild_search_index(self):
+        self.inner.rebuild_search_index()
+        self.invalidate(())
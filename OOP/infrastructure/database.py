@@ -1,18 +1,377 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from exceptions import DatabaseBusy
 
 DB_PATH = "perpustakaan.db"
+POOL_SIZE = 4
+
+# Per-connection PRAGMA sets. "safe" keeps SQLite's defaults (rollback
+# journal, synchronous=FULL). "performance" switches to WAL so readers never
+# wait for a writer's commit, and only syncs at checkpoints (a power cut can
+# lose the last commits but never corrupts the file).
+PROFILES = {
+    "safe": {
+        "busy_timeout": 5000,
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,  # KiB, i.e. ~64 MB page cache per connection
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+}
+DB_PROFILE = "performance"
 
 
 class Database:
     def connect(self):
         raise NotImplementedError
 
+    @contextmanager
+    def connection(self):
+        """Yield a connection for one unit of work and release it afterwards."""
+        conn = self.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def read_connection(self):
+        """Like ``connection()``, for work that only reads.
+
+        Implementations may route it to a read-only connection or a replica;
+        by default it is the same as ``connection()``.
+        """
+        return self.connection()
+
+    @contextmanager
+    def transaction(self):
+        """Yield a connection inside ``BEGIN IMMEDIATE``; commit on success, roll back on error.
+
+        Taking the write lock up front means concurrent writers queue on the
+        busy timeout instead of failing with a lock upgrade deadlock.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
 
 class SQLiteDatabase(Database):
-    def __init__(self, path: str):
+    """SQLite database with an optional bounded connection pool.
+
+    With ``pool_size=0`` every checkout opens a fresh connection (the old
+    behaviour). With ``pool_size>0`` at most that many connections are opened
+    lazily and reused; ``connection()`` blocks up to ``pool_timeout`` seconds
+    when all of them are checked out. ``profile`` names an entry of PROFILES
+    or is a dict of PRAGMAs applied to every new connection. ``read_only``
+    opens connections through a ``file:...?mode=ro`` URI, so SQLite itself
+    rejects any write made through them.
+    """
+
+    def __init__(self, path: str, pool_size: int = 0, pool_timeout: float = 5.0, profile="safe",
+                 read_only: bool = False):
         self.path = path
+        self.read_only = read_only
+        self.pragmas = PROFILES[profile] if isinstance(profile, str) else dict(profile)
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size) if pool_size > 0 else None
+        self._opened = 0
+        self._lock = threading.Lock()
 
-    def connect(self):
-        conn = sqlite3.connect(self.path)
+    def _open(self):
+        # pooled connections travel between threads, one holder at a time
+        if self.read_only:
+            # only these three characters are special in a SQLite URI path
+            path = os.path.abspath(self.path).replace(os.sep, "/")
+            path = path.replace("%", "%25").replace("?", "%3f").replace("#", "%23")
+            uri = f"file:{path}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=self._pool is None)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=self._pool is None)
         conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            if self.read_only and name == "journal_mode":
+                continue  # a file setting; the primary's connections own it
+            # names and values come from PROFILES / our own config, never user input
+            conn.execute(f"PRAGMA {name}={value}")
         return conn
+
+    def connect(self):
+        return self._open()
+
+    @contextmanager
+    def connection(self):
+        if self._pool is None:
+            with super().connection() as conn:
+                yield conn
+            return
+
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _checkout(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    try:
+                        conn = self._open()
+                    except Exception:
+                        self._opened -= 1
+                        raise
+            if conn is None:
+                try:
+                    conn = self._pool.get(timeout=self.pool_timeout)
+                except queue.Empty:
+                    raise DatabaseBusy("Koneksi database sedang penuh, coba lagi") from None
+        if not self._is_healthy(conn):
+            conn.close()
+            conn = self._open()
+        return conn
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = self._open()
+        self._pool.put(conn)
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        """Close every idle pooled connection."""
+        if self._pool is None:
+            return
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+class ReadRoutingDatabase(Database):
+    """Serve ``read_connection()`` from read-only connections, everything else from ``primary``.
+
+    Readers get their own pool of ``mode=ro`` connections, so catalog
+    browsing never waits for a pooled primary connection held by a writer.
+    With ``snapshot_interval`` set they read a private copy of the database
+    instead of the live file, made with the sqlite3 backup API and replaced
+    when it is older than that many seconds: readers then never touch the
+    primary's locks or WAL, at the cost of seeing data up to
+    ``snapshot_interval`` seconds old. Each process keeps its own readers
+    (and snapshot), so read capacity grows with the number of processes.
+    """
+
+    def __init__(self, primary: SQLiteDatabase, pool_size: int = POOL_SIZE, snapshot_interval: float = None):
+        self.primary = primary
+        self.pool_size = pool_size
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = 0
+        self._refresh_lock = threading.Lock()
+        self._snapshot_dir = None
+        self._refreshed = None
+        self._readers = None if snapshot_interval else self._reader_pool(primary.path)
+
+    def _reader_pool(self, path: str) -> SQLiteDatabase:
+        return SQLiteDatabase(
+            path, pool_size=self.pool_size, pool_timeout=self.primary.pool_timeout,
+            profile=self.primary.pragmas, read_only=True,
+        )
+
+    def refresh_snapshot(self):
+        """Copy the primary into a new snapshot file and switch readers to it."""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        # snapshot mode only; kept out of the import path of every command
+        import tempfile
+
+        if self._snapshot_dir is None:
+            self._snapshot_dir = tempfile.mkdtemp(prefix="perpustakaan_snapshot_")
+        self.snapshots += 1
+        path = os.path.join(self._snapshot_dir, f"snapshot_{self.snapshots}.db")
+        target = sqlite3.connect(path)
+        try:
+            with self.primary.connection() as source:
+                source.backup(target)
+            # the copy inherits WAL mode from the header; a plain file
+            # lets read-only connections open it without -wal/-shm files
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+        old, self._readers = self._readers, self._reader_pool(path)
+        self._refreshed = time.monotonic()
+        if old is not None:
+            # connections still checked out keep reading the old file until
+            # released; on POSIX the unlinked file lives on until then
+            old.close()
+            try:
+                os.remove(old.path)
+            except OSError:
+                pass
+
+    def _is_stale(self) -> bool:
+        return self._refreshed is None or time.monotonic() - self._refreshed >= self.snapshot_interval
+
+    def _current_readers(self) -> SQLiteDatabase:
+        if self.snapshot_interval and self._is_stale():
+            # the first read waits for a copy; later ones keep reading the
+            # current copy while one thread makes the next
+            if self._refresh_lock.acquire(blocking=self._readers is None):
+                try:
+                    if self._is_stale():
+                        self._refresh()
+                finally:
+                    self._refresh_lock.release()
+        return self._readers
+
+    def read_connection(self):
+        return self._current_readers().connection()
+
+    def snapshot_version(self) -> int:
+        """Number of the snapshot reads are served from, replacing it first when stale.
+
+        Caches in front of ``read_connection()`` compare it to drop what they
+        loaded from an older snapshot; it stays 0 without snapshots.
+        """
+        if self.snapshot_interval:
+            self._current_readers()
+        return self.snapshots
+
+    def connection(self):
+        return self.primary.connection()
+
+    def transaction(self):
+        return self.primary.transaction()
+
+    def close(self):
+        self.primary.close()
+        if self._readers is not None:
+            self._readers.close()
+        if self._snapshot_dir is not None:
+            import shutil
+
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+
+class GroupCommitWriter:
+    """Funnel small writes from many threads into shared transactions.
+
+    ``write(fn)`` queues ``fn(conn)`` and blocks until the transaction that
+    ran it has committed. A background thread takes up to ``max_batch``
+    queued writes (waiting at most ``max_delay`` seconds for more to arrive),
+    runs each inside its own SAVEPOINT and commits them together: one fsync
+    and one lock acquisition for the whole batch. A write that raises is
+    rolled back to its savepoint and its exception re-raised in the caller;
+    the rest of the batch still commits.
+    """
+
+    def __init__(self, db: Database, max_batch: int = 64, max_delay: float = 0.002):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn) -> Future:
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def write(self, fn):
+        return self.submit(fn).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            outcomes = []
+            try:
+                with self.db.transaction() as conn:
+                    for fn, future in batch:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        conn.execute("SAVEPOINT gc_write")
+                        try:
+                            result = fn(conn)
+                        except BaseException as e:
+                            conn.execute("ROLLBACK TO gc_write")
+                            conn.execute("RELEASE gc_write")
+                            outcomes.append((future, None, e))
+                        else:
+                            conn.execute("RELEASE gc_write")
+                            outcomes.append((future, result, None))
+            except BaseException as e:
+                # the commit itself failed: nothing in this batch was written
+                for fn, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.writes += len(outcomes)
+            for future, result, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
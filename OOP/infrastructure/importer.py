@@ -0,0 +1,62 @@
+"""Streaming readers for bulk catalog import files (CSV or JSON lines)."""
+
+import csv
+import json
+import os
+
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson"):
+        return "jsonl"
+    if ext == "csv":
+        return "csv"
+    raise ValueError(f"Format file tidak dikenali: {path} (gunakan .csv atau .jsonl)")
+
+
+def iter_book_records(path: str, fmt: str = None):
+    """Yield ``(position, record)`` for every data record in ``path``.
+
+    ``position`` counts records from 1 and is what import progress is saved
+    against. ``record`` is ``(title, author, year, copies)``, or None when
+    the record is invalid and should be skipped. CSV files need a header row
+    with ``title``, ``author`` and optionally ``year`` and ``copies``;
+    JSON-lines records use the same keys.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Format tidak didukung: {fmt}")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            items = csv.DictReader(f)
+        else:
+            items = (_parse_json(line) for line in f if line.strip())
+        for position, item in enumerate(items, start=1):
+            yield position, _to_record(item)
+
+
+def _parse_json(line: str):
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return item if isinstance(item, dict) else None
+
+
+def _to_record(item):
+    if not item:
+        return None
+    title = str(item.get("title") or "").strip()
+    author = str(item.get("author") or "").strip()
+    if not title or not author:
+        return None
+    try:
+        year = int(item["year"]) if item.get("year") not in (None, "") else None
+        copies = int(item["copies"]) if item.get("copies") not in (None, "") else 1
+    except (TypeError, ValueError):
+        return None
+    if copies < 0:
+        return None
+    return title, author, year, copies
@@ -0,0 +1,362 @@
+"""Hot-path instrumentation: per-query timing, repository call metrics, exports.
+
+``InstrumentedDatabase`` wraps any Database and times every statement run
+through its connections; ``instrument(repo, registry)`` wraps a repository
+and times every public method call. Both record into a ``MetricsRegistry``,
+which can be exported as a JSON-friendly snapshot or Prometheus text.
+"""
+
+import functools
+import inspect
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from infrastructure.database import Database
+
+log = logging.getLogger("perpustakaan.sql")
+
+# seconds; the implicit last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_QUERY_SECONDS = 0.1
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (approximate)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and latency histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def register_collector(self, name: str, fn):
+        """Add ``fn() -> {gauge_name: value}`` polled on every export (e.g. cache stats)."""
+        self._collectors[name] = fn
+
+    def _collect(self):
+        for name, fn in list(self._collectors.items()):
+            for gauge, value in fn().items():
+                if isinstance(value, (int, float)):
+                    self.set_gauge(f"{name}_{gauge}", value)
+
+    def snapshot(self) -> dict:
+        """Plain-dict view of every metric, suitable for ``json.dumps``."""
+        self._collect()
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._gauges.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.total,
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        self._collect()
+        lines = []
+        typed = set()
+
+        def label_str(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            body = ",".join(f'{k}="{_escape(str(v))}"' for k, v in items)
+            return "{" + body + "}"
+
+        def type_line(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                type_line(name, "counter")
+                lines.append(f"{name}{label_str(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                type_line(name, "gauge")
+                lines.append(f"{name}{label_str(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                type_line(name, "histogram")
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{label_str(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{label_str(labels)} {h.total}")
+                lines.append(f"{name}_count{label_str(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_WS = re.compile(r"\s+")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and ``IN (?,?,...)`` lists so one query is one label.
+
+    Memoized: repositories issue a small, fixed set of statement strings, so
+    the regexes run once per distinct statement instead of once per call.
+    """
+    return _PARAM_LIST.sub("(?...)", _WS.sub(" ", sql).strip())
+
+
+class _TimedCursor:
+    def __init__(self, cursor, db: "InstrumentedDatabase"):
+        self._cursor = cursor
+        self._db = db
+
+    def execute(self, sql, params=()):
+        with self._db._timed(sql, params):
+            self._cursor.execute(sql, params)
+        return self
+
+    def executemany(self, sql, seq):
+        with self._db._timed(sql, None):
+            self._cursor.executemany(sql, seq)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+class _TimedConnection:
+    def __init__(self, conn, db: "InstrumentedDatabase"):
+        self._conn = conn
+        self._db = db
+
+    def cursor(self):
+        return _TimedCursor(self._conn.cursor(), self._db)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def commit(self):
+        # the commit is where the fsync happens, so it gets its own label
+        with self._db._timed("COMMIT", ()):
+            self._conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+
+class InstrumentedDatabase(Database):
+    """Database decorator that counts connections and times every statement.
+
+    Statements slower than ``slow_seconds`` are logged on the
+    ``perpustakaan.sql`` logger with their SQL and parameter count; the
+    values themselves are left out, since some are password hashes.
+    """
+
+    def __init__(self, inner: Database, registry: MetricsRegistry, slow_seconds: float = SLOW_QUERY_SECONDS):
+        self.inner = inner
+        self.registry = registry
+        self.slow_seconds = slow_seconds
+
+    @contextmanager
+    def _timed(self, sql, params):
+        label = normalize_sql(sql)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.registry.inc("sql_errors_total", statement=label)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.registry.observe("sql_query_seconds", elapsed, statement=label)
+            if elapsed >= self.slow_seconds:
+                self.registry.inc("sql_slow_queries_total")
+                log.warning("slow query %.1f ms: %s (%s)", elapsed * 1000, label, _param_count(params))
+
+    def connect(self):
+        self.registry.inc("db_connections_opened_total")
+        return _TimedConnection(self.inner.connect(), self)
+
+    @contextmanager
+    def connection(self):
+        self.registry.inc("db_checkouts_total")
+        self.registry.add_gauge("db_connections_in_use", 1)
+        try:
+            with self.inner.connection() as conn:
+                yield _TimedConnection(conn, self)
+        finally:
+            self.registry.add_gauge("db_connections_in_use", -1)
+
+    @contextmanager
+    def read_connection(self):
+        self.registry.inc("db_read_checkouts_total")
+        with self.inner.read_connection() as conn:
+            yield _TimedConnection(conn, self)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def _param_count(params) -> str:
+    if params is None:
+        return "executemany"
+    return f"{len(params)} params"
+
+
+_DONE = object()
+
+
+class InstrumentedRepository:
+    """Proxy that times every public method of a repository.
+
+    Generator methods (streaming reads) are timed across the whole
+    iteration, counting only the time spent producing rows, not the
+    caller's work between them. Attribute reads and writes other than
+    method calls go straight to the wrapped repository, so it can be
+    configured through the proxy.
+    """
+
+    def __init__(self, inner, registry: MetricsRegistry, name: str = None):
+        object.__setattr__(self, "_inner", inner)
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name or type(inner).__name__)
+
+    def __getattr__(self, attr):
+        value = getattr(self._inner, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+        method = f"{self._name}.{attr}"
+        registry = self._registry
+
+        if inspect.isgeneratorfunction(value):
+            def timed_rows(*args, **kwargs):
+                elapsed = 0.0
+                rows = value(*args, **kwargs)
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            row = next(rows, _DONE)
+                        finally:
+                            elapsed += time.perf_counter() - start
+                        if row is _DONE:
+                            return
+                        yield row
+                except Exception:
+                    registry.inc("repo_errors_total", method=method)
+                    raise
+                finally:
+                    rows.close()
+                    registry.inc("repo_calls_total", method=method)
+                    registry.observe("repo_call_seconds", elapsed, method=method)
+
+            return timed_rows
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            except Exception:
+                registry.inc("repo_errors_total", method=method)
+                raise
+            finally:
+                registry.inc("repo_calls_total", method=method)
+                registry.observe("repo_call_seconds", time.perf_counter() - start, method=method)
+
+        return timed
+
+    def __setattr__(self, attr, value):
+        setattr(self._inner, attr, value)
+
+
+def instrument(repo, registry: MetricsRegistry, name: str = None):
+    return InstrumentedRepository(repo, registry, name)
@@ -0,0 +1,395 @@
+"""Versioned schema migrations tracked with ``PRAGMA user_version``.
+
+Each migration runs in its own transaction together with the version bump,
+so a database is always at exactly one known schema version. Add new steps
+to the end of ``MIGRATIONS``; never edit one that has already shipped.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from infrastructure import queries
+
+
+# Shared with BookRepository, which drops and recreates these around bulk imports.
+BOOKS_FTS_INSERT_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+END
+"""
+
+BOOKS_AVAILABLE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_books_available
+ON books(id) WHERE copies_available > 0
+"""
+
+# job_state flag set while a bulk import has the two objects above dropped;
+# its value is the importer's pid and updated_at is refreshed every chunk
+INDEXES_SUSPENDED = "import.indexes_suspended"
+# a flag whose heartbeat is older than this belongs to a dead importer
+IMPORT_HEARTBEAT_TIMEOUT = timedelta(minutes=10)
+
+
+def _v1_base_tables(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password_hash TEXT,
+        role TEXT,
+        created_at TEXT
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS books (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        author TEXT,
+        year INTEGER,
+        copies_total INTEGER,
+        copies_available INTEGER,
+        created_at TEXT
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS loans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        book_id INTEGER,
+        loan_date TEXT,
+        due_date TEXT,
+        return_date TEXT
+    )
+    """)
+
+
+def _v2_search_index(cur):
+    # external-content FTS5 table: stores only the index, rows live in books
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """)
+
+    cur.execute(BOOKS_FTS_INSERT_TRIGGER)
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    END
+    """)
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """)
+
+    # index books that were added before the FTS table existed
+    cur.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def _v3_query_indexes(cur):
+    # active-loan lookups: duplicate check and "my current loans"
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_loans_active_user_book
+    ON loans(user_id, book_id) WHERE return_date IS NULL
+    """)
+    # full history per user, newest first (rowid rides along in the index)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_loans_user ON loans(user_id)")
+    # catalog of borrowable books only
+    cur.execute(BOOKS_AVAILABLE_INDEX)
+
+
+def _v4_bulk_import(cur):
+    # duplicate check for imported titles
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_title_author ON books(title, author)")
+    # last committed record per import source, for resuming
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS import_progress (
+        source TEXT PRIMARY KEY,
+        position INTEGER NOT NULL,
+        updated_at TEXT
+    )
+    """)
+
+
+def _v5_due_dates(cur):
+    # open loans ordered by deadline: overdue / due-soon range scans
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_loans_return_due ON loans(return_date, due_date)")
+    # watermarks and other small state for batch jobs
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS job_state (
+        name TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TEXT
+    )
+    """)
+
+
+def _v6_circulation_stats(cur):
+    # running totals kept up to date by LoanRepository's borrow/return transactions
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS stats_book (
+        book_id INTEGER PRIMARY KEY,
+        loans_total INTEGER NOT NULL DEFAULT 0,
+        active_loans INTEGER NOT NULL DEFAULT 0,
+        last_loan_date TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS stats_user (
+        user_id INTEGER PRIMARY KEY,
+        loans_total INTEGER NOT NULL DEFAULT 0,
+        active_loans INTEGER NOT NULL DEFAULT 0,
+        last_loan_date TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY,
+        loans INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    # top-N reports walk these from the end
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_stats_book_total ON stats_book(loans_total)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_stats_user_total ON stats_user(loans_total)")
+    rebuild_circulation_stats(cur)
+
+
+def rebuild_circulation_stats(cur):
+    """Recompute the v6 summary tables from the loans table.
+
+    Used as the v6 backfill, and by bulk loaders that write loans with raw
+    SQL, bypassing LoanRepository's running totals.
+    """
+    cur.execute("DELETE FROM stats_book")
+    cur.execute("DELETE FROM stats_user")
+    cur.execute("DELETE FROM stats_daily")
+    cur.execute("""
+    INSERT OR REPLACE INTO stats_book (book_id, loans_total, active_loans, last_loan_date)
+    SELECT book_id, COUNT(*), SUM(return_date IS NULL), MAX(loan_date) FROM loans GROUP BY book_id
+    """)
+    cur.execute("""
+    INSERT OR REPLACE INTO stats_user (user_id, loans_total, active_loans, last_loan_date)
+    SELECT user_id, COUNT(*), SUM(return_date IS NULL), MAX(loan_date) FROM loans GROUP BY user_id
+    """)
+    cur.execute("""
+    INSERT OR REPLACE INTO stats_daily (day, loans, returns)
+    SELECT day, SUM(loans), SUM(returns) FROM (
+        SELECT substr(loan_date, 1, 10) AS day, 1 AS loans, 0 AS returns FROM loans
+        UNION ALL
+        SELECT substr(return_date, 1, 10), 0, 1 FROM loans WHERE return_date IS NOT NULL
+    ) GROUP BY day
+    """)
+
+
+def _v7_loans_archive(cur):
+    # returned loans moved out of the hot table by LoanRepository.archive_returned;
+    # ids are kept (loans.id is AUTOINCREMENT, so they are never reused)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS loans_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        book_id INTEGER,
+        loan_date TEXT,
+        due_date TEXT,
+        return_date TEXT,
+        archived_at TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_loans_archive_user ON loans_archive(user_id)")
+
+
+def _v8_holds(cur):
+    # FIFO reservation queue; a copy set aside for a 'ready' hold is not
+    # counted in books.copies_available
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS holds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        book_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        created_at TEXT,
+        ready_at TEXT,
+        expires_at TEXT
+    )
+    """)
+    # next in line for a book: (book_id, 'waiting') ORDER BY id
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_holds_book_status ON holds(book_id, status, id)")
+    # at most one open hold per user and book
+    cur.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_open_user_book
+    ON holds(user_id, book_id) WHERE status IN ('waiting', 'ready')
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_holds_user ON holds(user_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_holds_expiry ON holds(status, expires_at)")
+
+
+MIGRATIONS = [
+    (1, _v1_base_tables),
+    (2, _v2_search_index),
+    (3, _v3_query_indexes),
+    (4, _v4_bulk_import),
+    (5, _v5_due_dates),
+    (6, _v6_circulation_stats),
+    (7, _v7_loans_archive),
+    (8, _v8_holds),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """Apply every pending migration and return the resulting version."""
+    current = schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        # fast path for every start after the first: no DDL, no transaction
+        return current
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            step(cur)
+            # PRAGMA does not accept bound parameters; version is our own int
+            cur.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+
+def _process_alive(pid: int) -> bool:
+    if pid <= 1 or os.name == "nt":
+        # no pid recorded, or no harmless probe (os.kill terminates on Windows):
+        # the heartbeat decides alone
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by another user
+    return True
+
+
+def abandoned_import(cur) -> bool:
+    """True when the INDEXES_SUSPENDED flag is set by an importer that is gone.
+
+    An import still running in another process (its pid alive and its
+    heartbeat recent) is left alone. Costs one primary-key lookup when no
+    flag is set.
+    """
+    cur.execute("SELECT value, updated_at FROM job_state WHERE name=?", (INDEXES_SUSPENDED,))
+    row = cur.fetchone()
+    if row is None:
+        return False
+    value, updated_at = row
+    try:
+        pid = int(value)
+        heartbeat = datetime.fromisoformat(updated_at)
+    except (TypeError, ValueError):
+        return True
+    if pid == os.getpid():
+        return False
+    if datetime.utcnow() - heartbeat > IMPORT_HEARTBEAT_TIMEOUT:
+        return True
+    return not _process_alive(pid)
+
+
+def restore_suspended_indexes(cur, force: bool = False) -> bool:
+    """Recreate what a bulk import dropped if it never got to put it back.
+
+    ``BookRepository.suspend_search_index`` sets the INDEXES_SUSPENDED flag
+    in the transaction that drops the FTS insert trigger and the
+    availability index; ``rebuild_search_index`` clears it. A flag left by
+    an importer that is no longer alive (see ``abandoned_import``) means
+    the import was killed in between. Returns True when a repair was made.
+    ``force`` rebuilds whether or not the flag is set.
+    """
+    if not force and not abandoned_import(cur):
+        return False
+    cur.execute(BOOKS_FTS_INSERT_TRIGGER)
+    cur.execute(BOOKS_AVAILABLE_INDEX)
+    cur.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+    cur.execute("DELETE FROM job_state WHERE name=?", (INDEXES_SUSPENDED,))
+    return True
+
+
+# Repository queries that must be answered from an index, as the
+# repositories run them; id lists are checked with three placeholders.
+_MARKS = queries.in_marks(3)
+INDEXED_QUERIES = {
+    "UserRepository.find_by_username": (queries.USER_BY_USERNAME, ("u",)),
+    "BookRepository.list_available": (queries.BOOKS_AVAILABLE, ()),
+    "BookRepository.list_page": (queries.BOOKS_PAGE, (0, 20)),
+    "BookRepository.list_page(available_only)": (queries.BOOKS_PAGE_AVAILABLE, (0, 20)),
+    "AvailabilityIndex.verify": (queries.BOOK_STOCK_AFTER, (0, 10000)),
+    "BookRepository.get_by_id": (queries.BOOK_BY_ID, (1,)),
+    "BookRepository.search": (queries.BOOKS_SEARCH, ('"a"*', 50)),
+    "LoanRepository.find_active_by_user_and_book": (queries.LOAN_ACTIVE_BY_USER_AND_BOOK, (1, 1)),
+    "LoanRepository.find_active_by_id_and_user": (queries.LOAN_ACTIVE_BY_ID_AND_USER, (1, 1)),
+    "LoanRepository.active_loans_by_user": (queries.LOANS_ACTIVE_BY_USER, (1,)),
+    "LoanRepository.open_loans_due_between": (queries.LOANS_OPEN_DUE_BETWEEN, ("", "9", "", 0, 500)),
+    "LoanRepository.history_by_user": (
+        queries.LOAN_HISTORY_BY_USER.format(table="loans"), (1, 2**63 - 1, 20),
+    ),
+    "LoanRepository.history_by_user(archived)": (
+        queries.LOAN_HISTORY_BY_USER.format(table="loans_archive"), (1, 2**63 - 1, 20),
+    ),
+    "LoanRepository.archive_returned": (queries.LOANS_RETURNED_BEFORE, ("2026-01-01", 500)),
+    "LoanRepository.create_loans(stock)": (queries.BOOK_STOCK_IN.format(marks=_MARKS), (1, 2, 3)),
+    "LoanRepository.create_loans(active)": (queries.LOAN_ACTIVE_BOOKS_IN.format(marks=_MARKS), (1, 1, 2, 3)),
+    "LoanRepository.create_loans(holds)": (queries.HOLD_READY_BOOKS_IN.format(marks=_MARKS), (1, 1, 2, 3)),
+    "HoldRepository.next_waiting": (queries.HOLD_NEXT_WAITING, (1,)),
+    "LoanRepository.claim_hold": (queries.HOLD_CLAIM, (1, 1)),
+    "HoldRepository.by_user": (queries.HOLDS_BY_USER, (1,)),
+    "HoldRepository.expire": (queries.HOLDS_READY_EXPIRED, ("9", 500)),
+    "ReportRepository.top_books": (queries.REPORT_TOP_BOOKS, (10,)),
+    "ReportRepository.top_users": (queries.REPORT_TOP_USERS, (10,)),
+    "ReportRepository.daily": (queries.REPORT_DAILY, (14,)),
+}
+
+
+def full_scans(conn, queries=INDEXED_QUERIES):
+    """Return ``(name, plan_detail)`` for every query that scans a whole table."""
+    found = []
+    for name, (sql, params) in queries.items():
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[3]
+            # "SCAN t" is a table scan; "SCAN t USING (COVERING) INDEX ..." and
+            # "SCAN f VIRTUAL TABLE INDEX ..." walk an index instead
+            if detail.startswith("SCAN") and "INDEX" not in detail:
+                found.append((name, detail))
+    return found
+
+
+def check_query_plans(conn):
+    """Raise ``RuntimeError`` if any repository query needs a full table scan."""
+    found = full_scans(conn)
+    if found:
+        lines = "\n".join(f"  {name}: {detail}" for name, detail in found)
+        raise RuntimeError(f"Query tanpa indeks (full scan):\n{lines}")
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(":memory:")
+    print(f"schema version {migrate(conn)}")
+    check_query_plans(conn)
+    print(f"{len(INDEXED_QUERIES)} query plans OK")
@@ -0,0 +1,100 @@
+"""SQL of the repository queries whose plans ``migrations.check_query_plans`` checks.
+
+The repositories execute these exact strings and the plan check explains
+them, so a changed query is checked as it is run. Statements taking an id
+list contain ``{marks}`` for the placeholders (``in_marks``);
+``LOAN_HISTORY_BY_USER`` takes ``{table}`` (``loans`` or ``loans_archive``).
+"""
+
+from dataclasses import fields
+
+from entities import User, Book, Loan
+
+
+def columns(entity, alias: str = "") -> str:
+    """SELECT list for ``entity`` in field order, optionally table-qualified."""
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + f.name for f in fields(entity))
+
+
+def in_marks(count: int) -> str:
+    """``?,?,...`` with ``count`` placeholders, for ``IN ({marks})``."""
+    return ",".join("?" * count)
+
+
+USER_COLUMNS = columns(User)
+BOOK_COLUMNS = columns(Book)
+LOAN_COLUMNS = columns(Loan)
+
+USER_BY_USERNAME = f"SELECT {USER_COLUMNS} FROM users WHERE username=?"
+
+BOOK_BY_ID = f"SELECT {BOOK_COLUMNS} FROM books WHERE id=?"
+BOOKS_AVAILABLE = f"SELECT {BOOK_COLUMNS} FROM books WHERE copies_available > 0 ORDER BY id"
+BOOKS_PAGE = f"SELECT {BOOK_COLUMNS} FROM books WHERE id > ? ORDER BY id LIMIT ?"
+BOOKS_PAGE_AVAILABLE = f"SELECT {BOOK_COLUMNS} FROM books WHERE id > ? AND copies_available > 0 ORDER BY id LIMIT ?"
+BOOKS_SEARCH = f"""
+    SELECT {columns(Book, "b")} FROM books_fts f JOIN books b ON b.id = f.rowid
+    WHERE books_fts MATCH ?
+    ORDER BY bm25(books_fts, 10.0, 5.0)
+    LIMIT ?
+"""
+BOOK_STOCK_AFTER = "SELECT id, copies_available FROM books WHERE id > ? ORDER BY id LIMIT ?"
+BOOK_STOCK_IN = "SELECT id, copies_available FROM books WHERE id IN ({marks})"
+
+LOAN_ACTIVE_BY_USER_AND_BOOK = "SELECT 1 FROM loans WHERE user_id=? AND book_id=? AND return_date IS NULL"
+LOAN_ACTIVE_BY_ID_AND_USER = f"SELECT {LOAN_COLUMNS} FROM loans WHERE id=? AND user_id=? AND return_date IS NULL"
+LOAN_ACTIVE_BOOKS_IN = "SELECT book_id FROM loans WHERE user_id=? AND return_date IS NULL AND book_id IN ({marks})"
+LOANS_ACTIVE_BY_USER = """
+    SELECT l.id, l.book_id, b.title, b.author, l.loan_date, l.due_date
+    FROM loans l JOIN books b ON b.id = l.book_id
+    WHERE l.user_id=? AND l.return_date IS NULL
+"""
+LOANS_OPEN_DUE_BETWEEN = """
+    SELECT l.id, l.book_id, b.title, b.author, l.loan_date, l.due_date, l.return_date,
+           l.user_id, u.username
+    FROM loans l
+    JOIN users u ON u.id = l.user_id
+    JOIN books b ON b.id = l.book_id
+    WHERE l.return_date IS NULL AND l.due_date > ? AND l.due_date <= ?
+      AND (l.due_date, l.id) > (?, ?)
+    ORDER BY l.due_date, l.id
+    LIMIT ?
+"""
+LOAN_HISTORY_BY_USER = """
+    SELECT l.id, l.book_id, b.title, b.author, l.loan_date, l.due_date, l.return_date
+    FROM {table} l JOIN books b ON b.id = l.book_id
+    WHERE l.user_id=? AND l.id < ?
+    ORDER BY l.id DESC
+    LIMIT ?
+"""
+# return_date < ? also skips active loans (NULL never compares true)
+LOANS_RETURNED_BEFORE = "SELECT id FROM loans WHERE return_date < ? LIMIT ?"
+
+HOLD_NEXT_WAITING = "SELECT id, user_id FROM holds WHERE book_id=? AND status='waiting' ORDER BY id LIMIT 1"
+HOLD_CLAIM = "UPDATE holds SET status='claimed' WHERE user_id=? AND book_id=? AND status='ready'"
+HOLD_READY_BOOKS_IN = "SELECT book_id FROM holds WHERE user_id=? AND status='ready' AND book_id IN ({marks})"
+HOLDS_BY_USER = """
+    SELECT h.id, h.book_id, b.title, b.author, h.status, h.created_at, h.expires_at,
+           CASE WHEN h.status = 'waiting' THEN (
+               SELECT COUNT(*) FROM holds w
+               WHERE w.book_id = h.book_id AND w.status = 'waiting' AND w.id <= h.id
+           ) END
+    FROM holds h JOIN books b ON b.id = h.book_id
+    WHERE h.user_id=? AND h.status IN ('waiting', 'ready')
+    ORDER BY h.id
+"""
+HOLDS_READY_EXPIRED = "SELECT id, book_id FROM holds WHERE status='ready' AND expires_at <= ? LIMIT ?"
+
+REPORT_TOP_BOOKS = """
+    SELECT b.id, b.title, b.author, b.copies_total, s.loans_total, s.active_loans, s.last_loan_date
+    FROM stats_book s JOIN books b ON b.id = s.book_id
+    ORDER BY s.loans_total DESC
+    LIMIT ?
+"""
+REPORT_TOP_USERS = """
+    SELECT u.id, u.username, s.loans_total, s.active_loans, s.last_loan_date
+    FROM stats_user s JOIN users u ON u.id = s.user_id
+    ORDER BY s.loans_total DESC
+    LIMIT ?
+"""
+REPORT_DAILY = "SELECT day, loans, returns FROM stats_daily ORDER BY day DESC LIMIT ?"
@@ -1,261 +1,821 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
+import os
 import sqlite3
-from infrastructure.database import Database
+
+from infrastructure import queries
+from infrastructure.database import Database, GroupCommitWriter
+from infrastructure.migrations import INDEXES_SUSPENDED, restore_suspended_indexes
 from ports import LoanRepositoryPort
+from entities import User, Book, Loan, LoanDetail, BookStats, UserStats, DailyStats, Hold, BorrowResult
 from exceptions import UsernameAlreadyExists
 
+log = logging.getLogger("perpustakaan.repositories")
+
+
+def _row_factory(entity):
+    """Cursor row factory building ``entity`` positionally from each row.
+
+    Much cheaper than sqlite3.Row plus a dict per row, and the slotted
+    result is several times smaller; the SELECT list must follow the
+    entity's field order (use ``queries.columns``).
+    """
+    return lambda cursor, row: entity(*row)
+
+
+def _notify_stock(listeners, book_ids):
+    """Call every stock listener with ``book_ids``.
+
+    The change is already committed when listeners run, so a failing
+    listener is logged instead of turning a successful write into an error.
+    """
+    for listener in listeners:
+        try:
+            listener(book_ids)
+        except Exception:
+            log.exception("stock listener %r gagal untuk buku %s", listener, book_ids)
+
+
+_USER_ROW = _row_factory(User)
+_BOOK_ROW = _row_factory(Book)
+_LOAN_ROW = _row_factory(Loan)
+_LOAN_DETAIL_ROW = _row_factory(LoanDetail)
+# upper bound for "before this id" keyset queries
+_MAX_ID = 2**63 - 1
+
+
+def _promote_next_hold(cur, book_id: int, now: str):
+    """Mark the oldest waiting hold on ``book_id`` ready; returns its user id or None.
+
+    The caller supplies the copy (it is not in ``copies_available``). Must
+    run inside the caller's write transaction, which is what keeps the
+    queue consistent under concurrent returns.
+    """
+    cur.execute(queries.HOLD_NEXT_WAITING, (book_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    expires = (datetime.fromisoformat(now) + timedelta(days=Hold.READY_DAYS)).isoformat()
+    cur.execute(
+        "UPDATE holds SET status='ready', ready_at=?, expires_at=? WHERE id=?",
+        (now, expires, row[0]),
+    )
+    return row[1]
+
+
+def _release_copy(cur, book_id: int, now: str):
+    """Give a freed copy to the next waiting hold, or put it back on the shelf."""
+    if _promote_next_hold(cur, book_id, now) is None:
+        cur.execute(
+            "UPDATE books SET copies_available = copies_available + 1 WHERE id=?",
+            (book_id,),
+        )
+
 
 class UserRepository:
     def __init__(self, db: Database):
         self.db = db
 
     def find_by_username(self, username: str):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM users WHERE username=?", (username,))
-        row = cur.fetchone()
-        conn.close()
-        return row
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _USER_ROW
+            cur.execute(queries.USER_BY_USERNAME, (username,))
+            return cur.fetchone()
 
     def create(self, username: str, password_hash: str, role: str):
-        conn = self.db.connect()
-        cur = conn.cursor()
+        with self.db.connection() as conn:
+            self._insert(conn, username, password_hash, role)
+            conn.commit()
+
+    def _insert(self, conn, username: str, password_hash: str, role: str):
         try:
-            cur.execute(
+            conn.execute(
                 "INSERT INTO users (username, password_hash, role, created_at) VALUES (?,?,?,?)",
                 (username, password_hash, role, datetime.utcnow().isoformat()),
             )
-            conn.commit()
         except sqlite3.IntegrityError:
             # map DB integrity error to domain exception
-            conn.close()
             raise UsernameAlreadyExists(username)
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
 
     def promote_or_upsert_admin(self, username: str, password_hash: str):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM users WHERE username=?", (username,))
-        row = cur.fetchone()
-        if row:
-            cur.execute(
-                "UPDATE users SET role='admin', password_hash=? WHERE id=?",
-                (password_hash, row["id"]),
-            )
-        else:
-            self.create(username, password_hash, "admin")
-        conn.commit()
-        conn.close()
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM users WHERE username=?", (username,))
+            row = cur.fetchone()
+            if row:
+                cur.execute(
+                    "UPDATE users SET role='admin', password_hash=? WHERE id=?",
+                    (password_hash, row["id"]),
+                )
+            else:
+                self._insert(conn, username, password_hash, "admin")
+            conn.commit()
+
+    def update_password_hash(self, user_id: int, password_hash: str):
+        with self.db.connection() as conn:
+            conn.execute("UPDATE users SET password_hash=? WHERE id=?", (password_hash, user_id))
+            conn.commit()
 
     def list_all(self):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, role, created_at FROM users ORDER BY id")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _USER_ROW
+            cur.execute("SELECT id, username, role, created_at FROM users ORDER BY id")
+            return cur.fetchall()
 
 
 class BookRepository:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, stock_listeners=()):
         self.db = db
+        # same contract as LoanRepository.stock_listeners; bulk_insert passes
+        # the new ids as a range, and None means any book may have changed
+        self.stock_listeners = list(stock_listeners)
+
+    def _stock_changed(self, book_ids):
+        _notify_stock(self.stock_listeners, book_ids)
 
     def list_all(self):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM books ORDER BY id")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with self.db.read_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _BOOK_ROW
+            cur.execute(f"SELECT {queries.BOOK_COLUMNS} FROM books ORDER BY id")
+            return cur.fetchall()
 
     def list_available(self):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM books WHERE copies_available > 0 ORDER BY id")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-
-    def search(self, q: str):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT * FROM books WHERE title LIKE ? OR author LIKE ?",
-            (f"%{q}%", f"%{q}%"),
-        )
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with self.db.read_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _BOOK_ROW
+            cur.execute(queries.BOOKS_AVAILABLE)
+            return cur.fetchall()
+
+    def list_page(self, after_id: int = 0, limit: int = 20, available_only: bool = False):
+        """Return up to ``limit`` books with ``id > after_id`` in id order (keyset paging)."""
+        with self.db.read_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _BOOK_ROW
+            sql = queries.BOOKS_PAGE_AVAILABLE if available_only else queries.BOOKS_PAGE
+            cur.execute(sql, (after_id, limit))
+            return cur.fetchall()
+
+    def search(self, q: str, limit: int = 50):
+        """Full-text search on title/author, best matches first.
+
+        Every word of ``q`` is matched as a prefix, so "lask pel" finds
+        "Laskar Pelangi". An empty query returns the first ``limit`` books.
+        """
+        match = self._match_expression(q)
+        with self.db.read_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _BOOK_ROW
+            if not match:
+                cur.execute(f"SELECT {queries.BOOK_COLUMNS} FROM books ORDER BY id LIMIT ?", (limit,))
+            else:
+                cur.execute(queries.BOOKS_SEARCH, (match, limit))
+            return cur.fetchall()
+
+    @staticmethod
+    def _match_expression(q: str) -> str:
+        # quote each token so user input can't inject FTS5 query syntax
+        tokens = [t.replace('"', '""') for t in q.split()]
+        return " ".join(f'"{t}"*' for t in tokens if t.strip('"'))
 
     def add(self, title, author, year, copies):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO books (title, author, year, copies_total, copies_available, created_at) VALUES (?,?,?,?,?,?)",
-            (title, author, year, copies, copies, datetime.utcnow().isoformat()),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.connection() as conn:
+            cur = conn.execute(
+                "INSERT INTO books (title, author, year, copies_total, copies_available, created_at) VALUES (?,?,?,?,?,?)",
+                (title, author, year, copies, copies, datetime.utcnow().isoformat()),
+            )
+            book_id = cur.lastrowid
+            conn.commit()
+        self._stock_changed([book_id])
+
+    def bulk_insert(self, records, source: str = None, position: int = 0) -> int:
+        """Insert ``(title, author, year, copies)`` records in one transaction.
+
+        Records whose title and author already exist (in the table or earlier
+        in the same batch) are skipped. When ``source`` is given, ``position``
+        is saved as its resume point in the same transaction. Returns the
+        number of rows inserted.
+        """
+        now = datetime.utcnow().isoformat()
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            # under the write lock the new rows get the ids right after this one
+            first_id = cur.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM books").fetchone()[0]
+            cur.executemany(
+                """
+                INSERT INTO books (title, author, year, copies_total, copies_available, created_at)
+                SELECT ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM books WHERE title=? AND author=?)
+                """,
+                (
+                    (title, author, year, copies, copies, now, title, author)
+                    for title, author, year, copies in records
+                ),
+            )
+            inserted = max(cur.rowcount, 0)
+            if source is not None:
+                cur.execute(
+                    """
+                    INSERT INTO import_progress (source, position, updated_at) VALUES (?,?,?)
+                    ON CONFLICT(source) DO UPDATE SET position=excluded.position, updated_at=excluded.updated_at
+                    """,
+                    (source, position, now),
+                )
+            # heartbeat for abandoned_import(); no-op outside a suspended import
+            cur.execute("UPDATE job_state SET updated_at=? WHERE name=?", (now, INDEXES_SUSPENDED))
+            last_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM books").fetchone()[0]
+        if inserted:
+            self._stock_changed(range(first_id, last_id + 1))
+        return inserted
+
+    def import_position(self, source: str) -> int:
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT position FROM import_progress WHERE source=?", (source,))
+            row = cur.fetchone()
+            return row["position"] if row else 0
+
+    def clear_import_position(self, source: str):
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM import_progress WHERE source=?", (source,))
+            conn.commit()
+
+    def suspend_search_index(self):
+        """Stop per-row FTS and availability index maintenance ahead of a bulk load.
+
+        The drop is recorded in job_state in the same transaction, with this
+        process's pid; every ``bulk_insert`` refreshes its timestamp. If the
+        process dies before ``rebuild_search_index``, the next
+        ``DatabaseInitializer.init`` puts both back, while processes started
+        during a live import leave them alone.
+        """
+        with self.db.transaction() as conn:
+            conn.execute("DROP TRIGGER IF EXISTS books_fts_ai")
+            conn.execute("DROP INDEX IF EXISTS idx_books_available")
+            conn.execute(
+                """
+                INSERT INTO job_state (name, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at
+                """,
+                (INDEXES_SUSPENDED, str(os.getpid()), datetime.utcnow().isoformat()),
+            )
+
+    def rebuild_search_index(self):
+        """Recreate what ``suspend_search_index`` dropped and reindex the whole catalog."""
+        with self.db.transaction() as conn:
+            restore_suspended_indexes(conn.cursor(), force=True)
 
     def get_by_id(self, book_id: int):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM books WHERE id=?", (book_id,))
-        row = cur.fetchone()
-        conn.close()
-        return row
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _BOOK_ROW
+            cur.execute(queries.BOOK_BY_ID, (book_id,))
+            return cur.fetchone()
 
     def decrease_stock(self, book_id: int):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE books SET copies_available = copies_available - 1 WHERE id=?",
-            (book_id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.connection() as conn:
+            conn.execute(
+                "UPDATE books SET copies_available = copies_available - 1 WHERE id=?",
+                (book_id,),
+            )
+            conn.commit()
+        self._stock_changed([book_id])
 
     def increase_stock(self, book_id: int):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE books SET copies_available = copies_available + 1 WHERE id=?",
-            (book_id,),
-        )
-        conn.commit()
-        conn.close()
+        with self.db.connection() as conn:
+            conn.execute(
+                "UPDATE books SET copies_available = copies_available + 1 WHERE id=?",
+                (book_id,),
+            )
+            conn.commit()
+        self._stock_changed([book_id])
 
     def update_stock(self, book_id: int, new_total: int):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT copies_total, copies_available FROM books WHERE id=?", (book_id,))
-        row = cur.fetchone()
-        if not row:
-            conn.close()
-            raise ValueError("Buku tidak ditemukan")
-        current_total = row["copies_total"]
-        current_available = row["copies_available"]
-        delta = new_total - (current_total or 0)
-        new_available = (current_available or 0) + delta
-        if new_available < 0:
-            new_available = 0
-        cur.execute(
-            "UPDATE books SET copies_total=?, copies_available=? WHERE id=?",
-            (new_total, new_available, book_id),
-        )
-        conn.commit()
-        conn.close()
+        """Set the number of copies owned; copies on the shelf follow from what is out.
+
+        Copies out are counted from active loans and ready holds rather than
+        derived from the old totals, so shrinking the stock below what is
+        lent out and growing it again cannot leave more copies on the shelf
+        than the library owns.
+        """
+        if new_total < 0:
+            raise ValueError("Jumlah eksemplar tidak boleh negatif")
+        # one write transaction from the read to the last promotion: a borrow
+        # or return committing in between would otherwise be overwritten
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT COALESCE((SELECT active_loans FROM stats_book WHERE book_id = b.id), 0)
+                     + (SELECT COUNT(*) FROM holds WHERE book_id = b.id AND status = 'ready')
+                FROM books b WHERE b.id=?
+                """,
+                (book_id,),
+            )
+            row = cur.fetchone()
+            if not row:
+                raise ValueError("Buku tidak ditemukan")
+            new_available = min(max(new_total - row[0], 0), new_total)
+            cur.execute(
+                "UPDATE books SET copies_total=?, copies_available=? WHERE id=?",
+                (new_total, new_available, book_id),
+            )
+            # added copies serve the hold queue before the shelf
+            now = datetime.utcnow().isoformat()
+            for _ in range(new_available):
+                if _promote_next_hold(cur, book_id, now) is None:
+                    break
+                cur.execute(
+                    "UPDATE books SET copies_available = copies_available - 1 WHERE id=?",
+                    (book_id,),
+                )
+        self._stock_changed([book_id])
 
     def delete(self, book_id: int):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM books WHERE id=?", (book_id,))
-        conn.commit()
-        conn.close()
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM books WHERE id=?", (book_id,))
+            conn.commit()
+        self._stock_changed([book_id])
 
 
 class LoanRepository:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, stock_listeners=(), writer: GroupCommitWriter = None):
         self.db = db
+        # callables taking a list of book ids, called after a committed stock change
+        self.stock_listeners = list(stock_listeners)
+        # optional group-commit writer shared by concurrent borrow/return callers
+        self.writer = writer
+
+    def _write(self, fn):
+        """Run ``fn(conn)`` in a write transaction, via the group-commit writer if set."""
+        if self.writer is not None:
+            return self.writer.write(fn)
+        with self.db.transaction() as conn:
+            return fn(conn)
+
+    def _stock_changed(self, book_ids):
+        if book_ids:
+            _notify_stock(self.stock_listeners, book_ids)
+
+    def create(self, loan: Loan):
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO loans (user_id, book_id, loan_date, due_date) VALUES (?,?,?,?)",
+                (loan.user_id, loan.book_id, loan.loan_date, loan.due_date),
+            )
+            self._record_borrow(cur, loan.user_id, [loan.book_id], loan.loan_date)
+
+    def create_loan_and_decrease_stock(self, loan: Loan):
+        """Atomically decrease book stock and create loan using a single DB transaction.
+
+        The stock decrement and the duplicate-loan check are both guarded in
+        SQL, so concurrent borrowers can neither oversell a title nor get two
+        active loans of the same book. Business errors are raised as
+        ``ValueError`` after rolling the transaction back.
+        """
+        self._write(lambda conn: self._borrow(conn.cursor(), loan))
+        self._stock_changed([loan.book_id])
+
+    @staticmethod
+    def _borrow(cur, loan: Loan):
+        # a hold that is ready for this user already has a copy set aside
+        cur.execute(queries.HOLD_CLAIM, (loan.user_id, loan.book_id))
+        if cur.rowcount == 0:
+            cur.execute(
+                "UPDATE books SET copies_available = copies_available - 1 WHERE id=? AND copies_available > 0",
+                (loan.book_id,),
+            )
+        if cur.rowcount == 0:
+            cur.execute("SELECT 1 FROM books WHERE id=?", (loan.book_id,))
+            if cur.fetchone() is None:
+                raise ValueError("Buku tidak ditemukan")
+            raise ValueError("Buku tidak tersedia")
 
-    def create(self, data: dict):
-        conn = self.db.connect()
-        cur = conn.cursor()
         cur.execute(
-            "INSERT INTO loans (user_id, book_id, loan_date, due_date) VALUES (?,?,?,?)",
-            (data["user_id"], data["book_id"], data["loan_date"], data["due_date"]),
+            """
+            INSERT INTO loans (user_id, book_id, loan_date, due_date)
+            SELECT ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM loans WHERE user_id=? AND book_id=? AND return_date IS NULL
+            )
+            """,
+            (
+                loan.user_id, loan.book_id, loan.loan_date, loan.due_date,
+                loan.user_id, loan.book_id,
+            ),
         )
-        conn.commit()
-        conn.close()
+        if cur.rowcount == 0:
+            raise ValueError("Anda sudah meminjam buku ini")
+        LoanRepository._record_borrow(cur, loan.user_id, [loan.book_id], loan.loan_date)
 
-    def create_loan_and_decrease_stock(self, data: dict):
-        """Atomically decrease book stock and create loan using a single DB transaction."""
-        conn = self.db.connect()
-        cur = conn.cursor()
-        try:
-            # check available
-            cur.execute("SELECT copies_available FROM books WHERE id=?", (data["book_id"],))
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("Buku tidak ditemukan")
-            if row["copies_available"] <= 0:
-                raise ValueError("Buku tidak tersedia")
+    @staticmethod
+    def _record_borrow(cur, user_id, book_ids, loan_date):
+        """Bump the circulation summary tables inside the borrow transaction."""
+        cur.executemany(
+            """
+            INSERT INTO stats_book (book_id, loans_total, active_loans, last_loan_date) VALUES (?, 1, 1, ?)
+            ON CONFLICT(book_id) DO UPDATE SET
+                loans_total = loans_total + 1, active_loans = active_loans + 1, last_loan_date = excluded.last_loan_date
+            """,
+            [(book_id, loan_date) for book_id in book_ids],
+        )
+        n = len(book_ids)
+        cur.execute(
+            """
+            INSERT INTO stats_user (user_id, loans_total, active_loans, last_loan_date) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                loans_total = loans_total + excluded.loans_total,
+                active_loans = active_loans + excluded.active_loans,
+                last_loan_date = excluded.last_loan_date
+            """,
+            (user_id, n, n, loan_date),
+        )
+        cur.execute(
+            "INSERT INTO stats_daily (day, loans) VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET loans = loans + excluded.loans",
+            (loan_date[:10], n),
+        )
 
+    def create_loans(self, user_id: int, book_ids, loan_date: str, due_date: str, atomic: bool = True):
+        """Borrow several books for one user in a single transaction.
+
+        Availability, active loans and ready holds are checked for the whole
+        set with one ``IN (...)`` query each, and the writes are likewise
+        set-based, so the cost barely grows with the number of books. With
+        ``atomic`` nothing is borrowed unless every book can be; otherwise
+        the books that can be borrowed are. Returns a ``BorrowResult`` per
+        distinct book id, in request order.
+        """
+        book_ids = list(dict.fromkeys(book_ids))
+        results = self._write(lambda conn: self._borrow_many(conn.cursor(), user_id, book_ids, loan_date, due_date, atomic))
+        self._stock_changed([r.book_id for r in results if r.ok])
+        return results
+
+    @staticmethod
+    def _borrow_many(cur, user_id, book_ids, loan_date, due_date, atomic):
+        if not book_ids:
+            return []
+        marks = queries.in_marks(len(book_ids))
+        cur.execute(queries.BOOK_STOCK_IN.format(marks=marks), book_ids)
+        stock = dict(cur.fetchall())
+        cur.execute(queries.LOAN_ACTIVE_BOOKS_IN.format(marks=marks), (user_id, *book_ids))
+        borrowed = {row[0] for row in cur.fetchall()}
+        cur.execute(queries.HOLD_READY_BOOKS_IN.format(marks=marks), (user_id, *book_ids))
+        ready = {row[0] for row in cur.fetchall()}
+
+        errors = {}
+        for book_id in book_ids:
+            if book_id not in stock:
+                errors[book_id] = "Buku tidak ditemukan"
+            elif book_id in borrowed:
+                errors[book_id] = "Anda sudah meminjam buku ini"
+            elif book_id not in ready and stock[book_id] <= 0:
+                errors[book_id] = "Buku tidak tersedia"
+        if errors and atomic:
+            return [
+                BorrowResult(b, False, errors.get(b, "Dibatalkan karena ada buku lain yang gagal dipinjam"))
+                for b in book_ids
+            ]
+
+        ok = [b for b in book_ids if b not in errors]
+        claimed = [b for b in ok if b in ready]
+        from_shelf = [b for b in ok if b not in ready]
+        if claimed:
             cur.execute(
-                "UPDATE books SET copies_available = copies_available - 1 WHERE id=?",
-                (data["book_id"],),
+                f"UPDATE holds SET status='claimed' WHERE user_id=? AND status='ready' "
+                f"AND book_id IN ({','.join('?' * len(claimed))})",
+                (user_id, *claimed),
             )
+        if from_shelf:
             cur.execute(
+                f"UPDATE books SET copies_available = copies_available - 1 "
+                f"WHERE copies_available > 0 AND id IN ({','.join('?' * len(from_shelf))})",
+                from_shelf,
+            )
+            # the write lock was held since the SELECTs, so this only trips on a bug
+            if cur.rowcount != len(from_shelf):
+                raise RuntimeError("Stok buku berubah selama transaksi")
+        if ok:
+            cur.executemany(
                 "INSERT INTO loans (user_id, book_id, loan_date, due_date) VALUES (?,?,?,?)",
-                (data["user_id"], data["book_id"], data["loan_date"], data["due_date"]),
+                [(user_id, b, loan_date, due_date) for b in ok],
             )
-            conn.commit()
-        finally:
-            conn.close()
+            LoanRepository._record_borrow(cur, user_id, ok, loan_date)
+        return [BorrowResult(b, b not in errors, errors.get(b)) for b in book_ids]
 
-    def find_active_by_user_and_book(self, user_id, book_id):
-        conn = self.db.connect()
-        cur = conn.cursor()
+    @staticmethod
+    def _record_return(cur, user_id, book_id, return_date):
+        cur.execute("UPDATE stats_book SET active_loans = active_loans - 1 WHERE book_id=?", (book_id,))
+        cur.execute("UPDATE stats_user SET active_loans = active_loans - 1 WHERE user_id=?", (user_id,))
         cur.execute(
-            "SELECT 1 FROM loans WHERE user_id=? AND book_id=? AND return_date IS NULL",
-            (user_id, book_id),
+            "INSERT INTO stats_daily (day, returns) VALUES (?, 1) ON CONFLICT(day) DO UPDATE SET returns = returns + 1",
+            (return_date[:10],),
         )
-        row = cur.fetchone()
-        conn.close()
-        return row is not None
+
+    def find_active_by_user_and_book(self, user_id, book_id):
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(queries.LOAN_ACTIVE_BY_USER_AND_BOOK, (user_id, book_id))
+            return cur.fetchone() is not None
 
     def find_active_by_id_and_user(self, loan_id, user_id):
-        conn = self.db.connect()
-        cur = conn.cursor()
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _LOAN_ROW
+            cur.execute(queries.LOAN_ACTIVE_BY_ID_AND_USER, (loan_id, user_id))
+            return cur.fetchone()
+
+    def mark_returned(self, loan_id: int):
+        now = datetime.utcnow().isoformat()
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT user_id, book_id FROM loans WHERE id=? AND return_date IS NULL", (loan_id,))
+            row = cur.fetchone()
+            if row is None:
+                return
+            cur.execute("UPDATE loans SET return_date=? WHERE id=?", (now, loan_id))
+            self._record_return(cur, row["user_id"], row["book_id"], now)
+
+    def return_loan(self, loan_id: int, user_id: int):
+        """Mark an active loan returned and restock its book in one transaction."""
+        now = datetime.utcnow().isoformat()
+        book_id = self._write(lambda conn: self._return_one(conn.cursor(), loan_id, user_id, now))
+        if book_id is None:
+            raise ValueError("Data peminjaman tidak ditemukan")
+        self._stock_changed([book_id])
+
+    def return_loans(self, loan_ids, user_id: int):
+        """Return many loans in one transaction; returns the ids actually returned.
+
+        Ids that are unknown, belong to another user or are already returned
+        are skipped rather than failing the whole batch.
+        """
+        now = datetime.utcnow().isoformat()
+
+        def return_all(conn):
+            cur = conn.cursor()
+            done = []
+            for loan_id in dict.fromkeys(loan_ids):
+                book_id = self._return_one(cur, loan_id, user_id, now)
+                if book_id is not None:
+                    done.append((loan_id, book_id))
+            return done
+
+        done = self._write(return_all)
+        self._stock_changed([book_id for _, book_id in done])
+        return [loan_id for loan_id, _ in done]
+
+    @staticmethod
+    def _return_one(cur, loan_id, user_id, return_date):
+        """Return one loan inside the caller's transaction; returns its book id or None."""
         cur.execute(
-            "SELECT * FROM loans WHERE id=? AND user_id=? AND return_date IS NULL",
+            "SELECT book_id FROM loans WHERE id=? AND user_id=? AND return_date IS NULL",
             (loan_id, user_id),
         )
         row = cur.fetchone()
-        conn.close()
-        return row
-
-    def mark_returned(self, loan_id: int):
-        conn = self.db.connect()
-        cur = conn.cursor()
+        if row is None:
+            return None
+        # the return_date IS NULL guard makes a second return of the same loan a no-op
         cur.execute(
-            "UPDATE loans SET return_date=? WHERE id=?",
-            (datetime.utcnow().isoformat(), loan_id),
+            "UPDATE loans SET return_date=? WHERE id=? AND return_date IS NULL",
+            (return_date, loan_id),
         )
-        conn.commit()
-        conn.close()
+        if cur.rowcount == 0:
+            return None
+        _release_copy(cur, row["book_id"], return_date)
+        LoanRepository._record_return(cur, user_id, row["book_id"], return_date)
+        return row["book_id"]
+
+    def open_loans_due_between(self, after: str, until: str, batch_size: int = 500):
+        """Stream open loans with ``after < due_date <= until``, earliest deadline first.
+
+        Rows are fetched in keyset batches on ``(due_date, id)``, each on its
+        own short connection checkout, so memory stays flat on large tables.
+        """
+        last_due, last_id = "", 0
+        while True:
+            with self.db.connection() as conn:
+                cur = conn.cursor()
+                cur.row_factory = _LOAN_DETAIL_ROW
+                cur.execute(queries.LOANS_OPEN_DUE_BETWEEN, (after, until, last_due, last_id, batch_size))
+                rows = cur.fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_due, last_id = rows[-1].due_date, rows[-1].loan_id
 
     def active_loans_by_user(self, user_id):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT l.id AS loan_id, b.title, b.author, l.loan_date, l.due_date
-            FROM loans l JOIN books b ON b.id = l.book_id
-            WHERE l.user_id=? AND l.return_date IS NULL
-            """,
-            (user_id,),
-        )
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _LOAN_DETAIL_ROW
+            cur.execute(queries.LOANS_ACTIVE_BY_USER, (user_id,))
+            return cur.fetchall()
 
-    def history_by_user(self, user_id):
-        conn = self.db.connect()
-        cur = conn.cursor()
-        cur.execute(
+    def history_by_user(self, user_id, before_id: int = None, limit: int = 20, archived: bool = False):
+        """Return up to ``limit`` loans of a user with ``id < before_id``, newest first.
+
+        Keyset paging on the loan id: pass the last id of a page as
+        ``before_id`` to get the next one. ``archived=True`` reads the
+        loans moved to ``loans_archive`` instead of the live table.
+        """
+        table = "loans_archive" if archived else "loans"
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _LOAN_DETAIL_ROW
+            cur.execute(
+                queries.LOAN_HISTORY_BY_USER.format(table=table),
+                (user_id, before_id or _MAX_ID, limit),
+            )
+            return cur.fetchall()
+
+    def archive_returned(self, before: str, batch_size: int = 500) -> int:
+        """Move loans returned before ``before`` (ISO time) to ``loans_archive``.
+
+        Works in batches of ``batch_size`` loans, one short transaction each,
+        so borrowers are never blocked for long. Circulation statistics are
+        running totals and stay as they are. Returns the number of loans moved.
+        """
+        moved = 0
+        while True:
+            with self.db.transaction() as conn:
+                cur = conn.cursor()
+                cur.execute(queries.LOANS_RETURNED_BEFORE, (before, batch_size))
+                ids = [row[0] for row in cur.fetchall()]
+                if not ids:
+                    return moved
+                marks = ",".join("?" * len(ids))
+                cur.execute(
+                    f"""
+                    INSERT INTO loans_archive (id, user_id, book_id, loan_date, due_date, return_date, archived_at)
+                    SELECT id, user_id, book_id, loan_date, due_date, return_date, ?
+                    FROM loans WHERE id IN ({marks})
+                    """,
+                    (datetime.utcnow().isoformat(), *ids),
+                )
+                cur.execute(f"DELETE FROM loans WHERE id IN ({marks})", ids)
+            moved += len(ids)
+
+
+class HoldRepository:
+    """FIFO reservation queue per book.
+
+    Copies freed by a return are handed to the next holder inside the
+    return transaction (see ``_release_copy``); ``LoanRepository`` claims a
+    ready hold when its holder borrows the book. Every queue step is an
+    index lookup on ``holds(book_id, status, id)`` or ``holds(user_id, ...)``.
+    """
+
+    def __init__(self, db: Database, stock_listeners=()):
+        self.db = db
+        # same contract as LoanRepository.stock_listeners
+        self.stock_listeners = list(stock_listeners)
+
+    def place(self, user_id: int, book_id: int) -> int:
+        """Queue the user for a book that has no copy on the shelf; returns the hold id."""
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT copies_available FROM books WHERE id=?", (book_id,))
+            book = cur.fetchone()
+            if book is None:
+                raise ValueError("Buku tidak ditemukan")
+            if book[0] > 0:
+                raise ValueError("Buku masih tersedia, silakan langsung dipinjam")
+            cur.execute(
+                "SELECT 1 FROM loans WHERE user_id=? AND book_id=? AND return_date IS NULL",
+                (user_id, book_id),
+            )
+            if cur.fetchone() is not None:
+                raise ValueError("Anda sudah meminjam buku ini")
+            try:
+                cur.execute(
+                    "INSERT INTO holds (user_id, book_id, status, created_at) VALUES (?, ?, 'waiting', ?)",
+                    (user_id, book_id, datetime.utcnow().isoformat()),
+                )
+            except sqlite3.IntegrityError:
+                # idx_holds_open_user_book: one open hold per user and book
+                raise ValueError("Anda sudah mengantre buku ini") from None
+            return cur.lastrowid
+
+    def cancel(self, hold_id: int, user_id: int):
+        """Cancel an open hold; a copy already set aside moves on down the queue."""
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT book_id, status FROM holds WHERE id=? AND user_id=? AND status IN ('waiting', 'ready')",
+                (hold_id, user_id),
+            )
+            row = cur.fetchone()
+            if row is None:
+                raise ValueError("Data antrean tidak ditemukan")
+            cur.execute("UPDATE holds SET status='cancelled' WHERE id=?", (hold_id,))
+            if row["status"] == Hold.READY:
+                _release_copy(cur, row["book_id"], datetime.utcnow().isoformat())
+        if row["status"] == Hold.READY:
+            self._stock_changed([row["book_id"]])
+
+    def by_user(self, user_id: int):
+        """Open holds of a user, oldest first, with their queue position.
+
+        The position is counted on read: a range scan of the book's waiting
+        holds on ``holds(book_id, status, id)``, so O(position) per hold.
+        Queues are short and users hold few books, whereas a stored position
+        would have to be rewritten for everyone behind a hold on every
+        promotion, cancellation and expiry.
+        """
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _row_factory(Hold)
+            cur.execute(queries.HOLDS_BY_USER, (user_id,))
+            return cur.fetchall()
+
+    def expire(self, now: str, batch_size: int = 500) -> int:
+        """Expire ready holds whose pickup time passed before ``now``; returns how many.
+
+        Each freed copy goes to the next waiting holder or back on the shelf.
+        """
+        expired = 0
+        while True:
+            with self.db.transaction() as conn:
+                cur = conn.cursor()
+                cur.execute(queries.HOLDS_READY_EXPIRED, (now, batch_size))
+                rows = cur.fetchall()
+                for hold_id, book_id in rows:
+                    cur.execute("UPDATE holds SET status='expired' WHERE id=?", (hold_id,))
+                    _release_copy(cur, book_id, now)
+            self._stock_changed(list({book_id for _, book_id in rows}))
+            expired += len(rows)
+            if len(rows) < batch_size:
+                return expired
+
+    def _stock_changed(self, book_ids):
+        if book_ids:
+            _notify_stock(self.stock_listeners, book_ids)
+
+
+class ReportRepository:
+    """Circulation reports read from the summary tables maintained by LoanRepository.
+
+    Every query is a primary-key lookup or an index walk of at most
+    ``limit`` rows, so report cost does not grow with the loans table.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def _fetch(self, entity, sql, params):
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = _row_factory(entity)
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def top_books(self, limit: int = 10):
+        return self._fetch(BookStats, queries.REPORT_TOP_BOOKS, (limit,))
+
+    def top_users(self, limit: int = 10):
+        return self._fetch(UserStats, queries.REPORT_TOP_USERS, (limit,))
+
+    def daily(self, days: int = 14):
+        """Loans and returns per day, most recent first."""
+        return self._fetch(DailyStats, queries.REPORT_DAILY, (days,))
+
+    def book_stats(self, book_id: int):
+        rows = self._fetch(
+            BookStats,
             """
-            SELECT b.title, b.author, l.loan_date, l.due_date, l.return_date
-            FROM loans l JOIN books b ON b.id = l.book_id
-            WHERE l.user_id=?
-            ORDER BY l.id DESC
+            SELECT b.id, b.title, b.author, b.copies_total,
+                   COALESCE(s.loans_total, 0) AS loans_total,
+                   COALESCE(s.active_loans, 0) AS active_loans,
+                   s.last_loan_date
+            FROM books b LEFT JOIN stats_book s ON s.book_id = b.id
+            WHERE b.id=?
             """,
-            (user_id,),
+            (book_id,),
         )
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        return rows[0] if rows else None
+
+
+class JobStateRepository:
+    """Small key/value store for batch job bookkeeping such as watermarks."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def get(self, name: str, default: str = None):
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT value FROM job_state WHERE name=?", (name,))
+            row = cur.fetchone()
+            return row["value"] if row else default
+
+    def set(self, name: str, value: str):
+        with self.db.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO job_state (name, value, updated_at) VALUES (?,?,?)
+                ON CONFLICT(name) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at
+                """,
+                (name, value, datetime.utcnow().isoformat()),
+            )
@@ -1,21 +1,296 @@
-from infrastructure.database import SQLiteDatabase, DB_PATH
-from infrastructure.repositories import UserRepository, BookRepository, LoanRepository
-from application.services import AuthService, BookService, LoanService, DatabaseInitializer
-from utils import PasswordHasher
-from ui.cli import CLI
+import argparse
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+# Only what every command needs is imported here; the UI, HTTP server,
+# metrics and cache modules are imported by the code paths that use them
+# (python -m benchmarks.startup checks the import budget).
+from infrastructure.database import (
+    SQLiteDatabase, ReadRoutingDatabase, GroupCommitWriter, DB_PATH, DB_PROFILE, POOL_SIZE,
+)
+from infrastructure.importer import FORMATS
+from infrastructure.repositories import (
+    UserRepository, BookRepository, LoanRepository, HoldRepository, ReportRepository, JobStateRepository,
+)
+from application.services import (
+    AuthService, BookService, LoanService, HoldService, ReportService, OverdueService, DatabaseInitializer,
+    IMPORT_CHUNK_SIZE, DUE_SOON_DAYS, ARCHIVE_AFTER_MONTHS,
+)
+from utils import PasswordHasher, VerificationCache
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Sistem Perpustakaan")
+    parser.add_argument("--no-book-cache", dest="book_cache", action="store_false", help="matikan cache baca katalog")
+    parser.add_argument("--no-metrics", dest="metrics", action="store_false", help="matikan pengukuran query & repository")
+    parser.add_argument(
+        "--read-pool", type=int, default=0,
+        help="jumlah koneksi baca-saja (mode=ro) khusus katalog; 0 = pakai koneksi utama",
+    )
+    parser.add_argument(
+        "--snapshot-interval", type=float,
+        help="baca katalog dari salinan database yang diperbarui paling lama setiap N detik",
+    )
+    parser.add_argument(
+        "--availability-index", action="store_true",
+        help="jawab ketersediaan buku dari indeks di memori (dimuat saat start)",
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    imp = sub.add_parser("import", help="Impor katalog buku dari file CSV/JSONL")
+    imp.add_argument("path", help="file .csv (header: title,author,year,copies) atau .jsonl")
+    imp.add_argument("--format", choices=FORMATS, help="paksa format file")
+    imp.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="baris per transaksi")
+    imp.add_argument("--resume", action="store_true", help="lanjutkan impor yang terputus")
+    imp.add_argument(
+        "--no-defer-index", dest="defer_indexes", action="store_false",
+        help="perbarui indeks pencarian per baris, bukan sekali di akhir",
+    )
+
+    serve = sub.add_parser("serve", help="Jalankan server HTTP/JSON API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--verbose", action="store_true", help="log setiap request")
+    serve.add_argument(
+        "--verify-availability", type=float, metavar="DETIK",
+        help="cocokkan indeks ketersediaan dengan database setiap N detik (mengaktifkan indeks)",
+    )
+
+    overdue = sub.add_parser("overdue", help="Pindai peminjaman terlambat dan hampir jatuh tempo")
+    overdue.add_argument("--interval", type=float, help="jalankan ulang setiap N detik (mode terjadwal)")
+    overdue.add_argument("--due-soon-days", type=int, default=DUE_SOON_DAYS, help="batas hari 'hampir jatuh tempo'")
+    overdue.add_argument("--all", action="store_true", help="tampilkan semua yang terlambat, abaikan watermark")
+
+    archive = sub.add_parser("archive", help="Pindahkan peminjaman lama yang sudah kembali ke arsip")
+    archive.add_argument(
+        "--months", type=int, default=ARCHIVE_AFTER_MONTHS,
+        help="arsipkan yang dikembalikan lebih dari N bulan lalu",
+    )
+
+    holds = sub.add_parser("expire-holds", help="Lepaskan buku antrean yang tidak diambil tepat waktu")
+    holds.add_argument("--interval", type=float, help="jalankan ulang setiap N detik (mode terjadwal)")
+
+    # command mode (ui/commands.py): one command, JSON output, no prompts
+    borrow = sub.add_parser("borrow", help="Pinjamkan buku atas nama pengguna")
+    borrow.add_argument("--user", required=True, help="username peminjam")
+    borrow.add_argument("--book", dest="books", type=int, action="append", required=True, help="id buku (bisa diulang)")
+    borrow.add_argument(
+        "--partial", dest="atomic", action="store_false", default=None,
+        help="pinjam yang tersedia saja bila ada buku yang gagal",
+    )
+
+    ret = sub.add_parser("return", help="Kembalikan peminjaman atas nama pengguna")
+    ret.add_argument("--user", required=True, help="username peminjam")
+    ret.add_argument("--loan", dest="loans", type=int, action="append", required=True, help="id peminjaman (bisa diulang)")
+
+    search = sub.add_parser("search", help="Cari buku (keluaran JSON)")
+    search.add_argument("q", help="kata kunci judul/penulis")
+    search.add_argument("--limit", type=int)
+
+    report = sub.add_parser("report", help="Laporan sirkulasi (keluaran JSON)")
+    report.add_argument("kind", nargs="?", default="books", choices=("books", "users", "daily"))
+    report.add_argument("--limit", type=int, help="jumlah baris, atau jumlah hari untuk 'daily'")
+
+    sub.add_parser("batch", help="Jalankan perintah JSON per baris dari stdin, hasil JSON per baris")
+    return parser
+
+
+COMMANDS = ("borrow", "return", "search", "report", "batch")
+GLOBAL_OPTIONS = ("command", "book_cache", "metrics", "read_pool", "snapshot_interval", "availability_index")
+
+
+def run_server(auth: AuthService, books: BookService, loans: LoanService, holds: HoldService, args):
+    from ui.http_api import LibraryAPI, make_server
+
+    server = make_server(LibraryAPI(auth, books, loans, holds=holds), args.host, args.port, quiet=not args.verbose)
+    print(f"Server berjalan di http://{args.host}:{args.port} (Ctrl+C untuk berhenti)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def start_availability_checks(index, interval: float):
+    """Verify (and repair) the availability index every ``interval`` seconds in the background."""
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            index.verify(repair=True)
+
+    threading.Thread(target=loop, name="availability-verify", daemon=True).start()
 
-if __name__ == "__main__":
-    db = SQLiteDatabase(DB_PATH)
-    hasher = PasswordHasher()
+
+def run_import(books: BookService, args):
+    def report(stats):
+        print(
+            f"  baris {stats['position']}: {stats['inserted']} ditambahkan, "
+            f"{stats['duplicates']} duplikat, {stats['invalid']} tidak valid",
+            flush=True,
+        )
+
+    print(f"Mengimpor {args.path} ...")
+    stats = books.bulk_import(
+        args.path,
+        fmt=args.format,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        defer_indexes=args.defer_indexes,
+        progress=report,
+    )
+    print("Selesai.")
+    report(stats)
+
+
+def run_overdue(service: OverdueService, args):
+    labels = {OverdueService.OVERDUE: "TERLAMBAT", OverdueService.DUE_SOON: "HAMPIR JATUH TEMPO"}
+
+    def show(kind, row):
+        print(
+            f"[{labels[kind]}] pinjaman {row.loan_id}: {row.username} - "
+            f"{row.title} (jatuh tempo {row.due_date[:10]})",
+            flush=True,
+        )
+
+    if args.all:
+        for row in service.overdue():
+            show(OverdueService.OVERDUE, row)
+        return
+    try:
+        while True:
+            counts = service.run_batch(show)
+            print(
+                f"{counts[OverdueService.OVERDUE]} baru terlambat, "
+                f"{counts[OverdueService.DUE_SOON]} baru hampir jatuh tempo",
+                flush=True,
+            )
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_expire_holds(holds: HoldService, args):
+    try:
+        while True:
+            print(f"{holds.expire()} antrean kedaluwarsa dilepaskan.", flush=True)
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_commands(app, args) -> int:
+    """Command mode; returns the exit status (1 if any command failed)."""
+    import json
+    from ui.commands import CommandRunner
+
+    runner = CommandRunner(app.auth, app.books, app.loans, app.holds, app.reports)
+    if args.command == "batch":
+        return 1 if runner.run_lines(sys.stdin, sys.stdout) else 0
+    options = {k: v for k, v in vars(args).items() if k not in GLOBAL_OPTIONS and v is not None}
+    result = runner.run({"cmd": args.command, **options})
+    print(json.dumps(result, ensure_ascii=False))
+    return 0 if result["ok"] else 1
+
+
+def build(args, db_path: str = DB_PATH, pool_size: int = POOL_SIZE):
+    """Wire the database, repositories and services selected by ``args``."""
+    metrics = None
+    db = SQLiteDatabase(db_path, pool_size=pool_size, profile=DB_PROFILE)
+    snapshot_version = None
+    if args.read_pool or args.snapshot_interval:
+        # catalog reads go to their own read-only connections (or a snapshot copy)
+        db = ReadRoutingDatabase(db, args.read_pool or POOL_SIZE, args.snapshot_interval)
+        if args.snapshot_interval:
+            snapshot_version = db.snapshot_version
+    if args.metrics:
+        from infrastructure.metrics import MetricsRegistry, InstrumentedDatabase, instrument
+
+        metrics = MetricsRegistry()
+        db = InstrumentedDatabase(db, metrics)
+    hasher = PasswordHasher(workers=os.cpu_count() or 1, cache=VerificationCache())
 
     user_repo = UserRepository(db)
     book_repo = BookRepository(db)
     loan_repo = LoanRepository(db)
+    hold_repo = HoldRepository(db)
+    availability = None
+    if args.availability_index or getattr(args, "verify_availability", None):
+        from infrastructure.availability import AvailabilityIndex
 
-    auth = AuthService(user_repo, hasher)
-    books = BookService(book_repo)
-    loans = LoanService(loan_repo, book_repo)
+        availability = AvailabilityIndex(db)
+        # every committed stock change re-reads the affected books
+        for repo in (book_repo, loan_repo, hold_repo):
+            repo.stock_listeners.append(availability.refresh)
+    if metrics:
+        user_repo = instrument(user_repo, metrics)
+        book_repo = instrument(book_repo, metrics)
+        loan_repo = instrument(loan_repo, metrics)
+        hold_repo = instrument(hold_repo, metrics)
+    if args.book_cache:
+        from infrastructure.cache import CachedBookRepository
 
+        # with snapshots, the cache is dropped whenever a newer copy is in use
+        book_repo = CachedBookRepository(book_repo, source_version=snapshot_version)
+        loan_repo.stock_listeners.append(book_repo.invalidate)
+        hold_repo.stock_listeners.append(book_repo.invalidate)
+        if metrics:
+            metrics.register_collector("book_cache", book_repo.stats)
+
+    # no-op (one PRAGMA read) when the schema is already current
     DatabaseInitializer(db, hasher, user_repo).init()
+    if availability is not None:
+        availability.load()
+        if metrics:
+            metrics.register_collector("availability_index", availability.stats)
+
+    return SimpleNamespace(
+        db=db,
+        metrics=metrics,
+        loan_repo=loan_repo,
+        availability=availability,
+        auth=AuthService(user_repo, hasher),
+        books=BookService(book_repo, availability),
+        loans=LoanService(loan_repo, book_repo),
+        holds=HoldService(hold_repo),
+        reports=ReportService(ReportRepository(db)),
+    )
+
 
-    CLI(auth, books, loans).run()
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # command mode is single-threaded: the whole batch reuses one connection
+    app = build(args, pool_size=1 if args.command in COMMANDS else POOL_SIZE)
+
+    if args.command == "import":
+        run_import(app.books, args)
+    elif args.command == "overdue":
+        run_overdue(OverdueService(app.loan_repo, JobStateRepository(app.db), args.due_soon_days), args)
+    elif args.command == "expire-holds":
+        run_expire_holds(app.holds, args)
+    elif args.command == "archive":
+        print(f"{app.loans.archive_returned(args.months)} peminjaman dipindahkan ke arsip.")
+    elif args.command in COMMANDS:
+        sys.exit(run_commands(app, args))
+    elif args.command == "serve":
+        # many concurrent clients: share commits between their borrow/return writes
+        app.loan_repo.writer = GroupCommitWriter(app.db)
+        if args.verify_availability:
+            start_availability_checks(app.availability, args.verify_availability)
+        run_server(app.auth, app.books, app.loans, app.holds, args)
+    else:
+        from ui.cli import CLI
+
+        CLI(app.auth, app.books, app.loans, app.metrics, app.reports, app.holds).run()
+
+
+if __name__ == "__main__":
+    main()
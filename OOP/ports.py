@@ -1,31 +1,57 @@
-from typing import Protocol, Iterable, Optional, Dict, Any
+from typing import Protocol, Iterable, Optional, ContextManager, List, Tuple, Iterator
 import sqlite3
 
+from entities import User, Book, Loan, LoanDetail, BookStats, UserStats, DailyStats, Hold, BorrowResult
+
 
 class DatabasePort(Protocol):
     def connect(self) -> sqlite3.Connection: ...
 
+    def connection(self) -> ContextManager[sqlite3.Connection]: ...
+
+    def read_connection(self) -> ContextManager[sqlite3.Connection]: ...
+
+    def transaction(self) -> ContextManager[sqlite3.Connection]: ...
+
 
 class UserRepositoryPort(Protocol):
-    def find_by_username(self, username: str) -> Optional[Dict[str, Any]]: ...
+    def find_by_username(self, username: str) -> Optional[User]: ...
 
     def create(self, username: str, password_hash: str, role: str) -> None: ...
 
     def promote_or_upsert_admin(self, username: str, password_hash: str) -> None: ...
 
-    def list_all(self) -> Iterable[Dict[str, Any]]: ...
+    def update_password_hash(self, user_id: int, password_hash: str) -> None: ...
+
+    def list_all(self) -> List[User]: ...
 
 
 class BookRepositoryPort(Protocol):
-    def list_all(self) -> Iterable[Dict[str, Any]]: ...
+    def list_all(self) -> List[Book]: ...
+
+    def list_available(self) -> List[Book]: ...
 
-    def list_available(self) -> Iterable[Dict[str, Any]]: ...
+    def list_page(
+        self, after_id: int = 0, limit: int = 20, available_only: bool = False
+    ) -> List[Book]: ...
 
-    def search(self, q: str) -> Iterable[Dict[str, Any]]: ...
+    def search(self, q: str, limit: int = 50) -> List[Book]: ...
 
     def add(self, title: str, author: str, year: int, copies: int) -> None: ...
 
-    def get_by_id(self, book_id: int) -> Optional[Dict[str, Any]]: ...
+    def bulk_insert(
+        self, records: Iterable[Tuple[str, str, Optional[int], int]], source: Optional[str] = None, position: int = 0
+    ) -> int: ...
+
+    def import_position(self, source: str) -> int: ...
+
+    def clear_import_position(self, source: str) -> None: ...
+
+    def suspend_search_index(self) -> None: ...
+
+    def rebuild_search_index(self) -> None: ...
+
+    def get_by_id(self, book_id: int) -> Optional[Book]: ...
 
     def decrease_stock(self, book_id: int) -> None: ...
 
@@ -36,17 +62,117 @@ class BookRepositoryPort(Protocol):
     def delete(self, book_id: int) -> None: ...
 
 
+class AvailabilityIndexPort(Protocol):
+    def available(self, book_id: int) -> Optional[int]: ...
+
+    def is_available(self, book_id: int) -> bool: ...
+
+    def available_ids(self, after_id: int = 0, limit: Optional[int] = None) -> List[int]: ...
+
+
 class LoanRepositoryPort(Protocol):
-    def create(self, data: Dict[str, Any]) -> None: ...
+    def create(self, loan: Loan) -> None: ...
 
     def find_active_by_user_and_book(self, user_id: int, book_id: int) -> bool: ...
 
-    def find_active_by_id_and_user(self, loan_id: int, user_id: int) -> Optional[Dict[str, Any]]: ...
+    def find_active_by_id_and_user(self, loan_id: int, user_id: int) -> Optional[Loan]: ...
 
     def mark_returned(self, loan_id: int) -> None: ...
 
-    def active_loans_by_user(self, user_id: int) -> Iterable[Dict[str, Any]]: ...
+    def return_loan(self, loan_id: int, user_id: int) -> None: ...
+
+    def return_loans(self, loan_ids: Iterable[int], user_id: int) -> List[int]: ...
+
+    def active_loans_by_user(self, user_id: int) -> List[LoanDetail]: ...
+
+    def history_by_user(
+        self, user_id: int, before_id: Optional[int] = None, limit: int = 20, archived: bool = False
+    ) -> List[LoanDetail]: ...
+
+    def archive_returned(self, before: str, batch_size: int = 500) -> int: ...
+
+    def create_loan_and_decrease_stock(self, loan: Loan) -> None: ...
+
+    def create_loans(
+        self, user_id: int, book_ids: Iterable[int], loan_date: str, due_date: str, atomic: bool = True
+    ) -> List[BorrowResult]: ...
+
+    def open_loans_due_between(
+        self, after: str, until: str, batch_size: int = 500
+    ) -> Iterator[LoanDetail]: ...
+
+
+class HoldRepositoryPort(Protocol):
+    def place(self, user_id: int, book_id: int) -> int: ...
+
+    def cancel(self, hold_id: int, user_id: int) -> None: ...
+
+    def by_user(self, user_id: int) -> List[Hold]: ...
+
+    def expire(self, now: str, batch_size: int = 500) -> int: ...
+
+
+class ReportRepositoryPort(Protocol):
+    def top_books(self, limit: int = 10) -> List[BookStats]: ...
+
+    def top_users(self, limit: int = 10) -> List[UserStats]: ...
+
+    def daily(self, days: int = 14) -> List[DailyStats]: ...
+
+    def book_stats(self, book_id: int) -> Optional[BookStats]: ...
+
+
+class JobStateRepositoryPort(Protocol):
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]: ...
+
+    def set(self, name: str, value: str) -> None: ...
+
+
+class AsyncUserRepositoryPort(Protocol):
+    async def find_by_username(self, username: str) -> Optional[User]: ...
+
+    async def create(self, username: str, password_hash: str, role: str) -> None: ...
+
+    async def promote_or_upsert_admin(self, username: str, password_hash: str) -> None: ...
+
+    async def update_password_hash(self, user_id: int, password_hash: str) -> None: ...
+
+    async def list_all(self) -> List[User]: ...
+
+
+class AsyncBookRepositoryPort(Protocol):
+    async def list_all(self) -> List[Book]: ...
+
+    async def list_available(self) -> List[Book]: ...
+
+    async def list_page(
+        self, after_id: int = 0, limit: int = 20, available_only: bool = False
+    ) -> List[Book]: ...
+
+    async def search(self, q: str, limit: int = 50) -> List[Book]: ...
+
+    async def add(self, title: str, author: str, year: int, copies: int) -> None: ...
+
+    async def get_by_id(self, book_id: int) -> Optional[Book]: ...
+
+    async def update_stock(self, book_id: int, new_total: int) -> None: ...
+
+    async def delete(self, book_id: int) -> None: ...
+
+
+class AsyncLoanRepositoryPort(Protocol):
+    async def create_loan_and_decrease_stock(self, loan: Loan) -> None: ...
+
+    async def create_loans(
+        self, user_id: int, book_ids: Iterable[int], loan_date: str, due_date: str, atomic: bool = True
+    ) -> List[BorrowResult]: ...
+
+    async def return_loan(self, loan_id: int, user_id: int) -> None: ...
+
+    async def return_loans(self, loan_ids: Iterable[int], user_id: int) -> List[int]: ...
 
-    def history_by_user(self, user_id: int) -> Iterable[Dict[str, Any]]: ...
+    async def active_loans_by_user(self, user_id: int) -> List[LoanDetail]: ...
 
-    def create_loan_and_decrease_stock(self, data: Dict[str, Any]) -> None: ...
+    async def history_by_user(
+        self, user_id: int, before_id: Optional[int] = None, limit: int = 20, archived: bool = False
+    ) -> List[LoanDetail]: ...
@@ -1,5 +1,23 @@
-"""User Interface layer: CLI."""
+"""User Interface layer: interactive CLI, command/batch mode and HTTP API.
 
-from ui.cli import CLI
+Names are imported on first access (PEP 562), so command mode does not
+load the interactive menus.
+"""
 
-__all__ = ["CLI"]
+import importlib
+
+_EXPORTS = {
+    "CLI": "ui.cli",
+    "CommandRunner": "ui.commands",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -1,14 +1,20 @@
-from entities import User
+from entities import User, Hold
 from exceptions import UsernameAlreadyExists
-from application.services import AuthService, BookService, LoanService
+from application.services import (
+    AuthService, BookService, LoanService, HoldService, ReportService, SEARCH_LIMIT, PAGE_SIZE,
+)
 from utils import clear_screen, pause
 
 
 class CLI:
-    def __init__(self, auth: AuthService, books: BookService, loans: LoanService):
+    def __init__(self, auth: AuthService, books: BookService, loans: LoanService, metrics=None,
+                 reports: ReportService = None, holds: HoldService = None):
         self.auth = auth
         self.books = books
         self.loans = loans
+        self.metrics = metrics
+        self.reports = reports
+        self.holds = holds
 
     def run(self):
         while True:
@@ -49,24 +55,28 @@ class CLI:
                 pause()
 
     def ui_list_all(self):
-        clear_screen()
-        rows = self.books.list_all()
-        print("=== Daftar Buku ===")
-        if not rows:
-            print("Belum ada buku.")
-        for r in rows:
-            print(f"[{r['id']}] {r['title']} - {r['author']} ({r['year']}) | Tersedia: {r['copies_available']}/{r['copies_total']}")
-        pause()
+        self._ui_book_pages("=== Daftar Buku ===", "Belum ada buku.", available_only=False)
 
     def ui_list_available(self):
-        clear_screen()
-        rows = self.books.list_available()
-        print("=== Buku Tersedia ===")
-        if not rows:
-            print("Tidak ada buku tersedia.")
-        for r in rows:
-            print(f"[{r['id']}] {r['title']} - {r['author']} ({r['year']}) | Tersedia: {r['copies_available']}/{r['copies_total']}")
-        pause()
+        self._ui_book_pages("=== Buku Tersedia ===", "Tidak ada buku tersedia.", available_only=True)
+
+    def _ui_book_pages(self, header: str, empty_msg: str, available_only: bool):
+        cursor = None
+        page_no = 1
+        while True:
+            clear_screen()
+            rows, cursor = self.books.page(cursor, PAGE_SIZE, available_only)
+            print(f"{header} (halaman {page_no})")
+            if not rows and page_no == 1:
+                print(empty_msg)
+            for r in rows:
+                print(f"[{r.id}] {r.title} - {r.author} ({r.year}) | Tersedia: {r.copies_available}/{r.copies_total}")
+            if cursor is None:
+                pause()
+                return
+            if input("Enter = halaman berikutnya, q = selesai: ").strip().lower() == "q":
+                return
+            page_no += 1
 
     def ui_search(self):
         clear_screen()
@@ -76,7 +86,9 @@ class CLI:
         if not rows:
             print("Tidak ada hasil.")
         for r in rows:
-            print(f"[{r['id']}] {r['title']} - {r['author']} ({r['year']}) | Tersedia: {r['copies_available']}/{r['copies_total']}")
+            print(f"[{r.id}] {r.title} - {r.author} ({r.year}) | Tersedia: {r.copies_available}/{r.copies_total}")
+        if len(rows) >= SEARCH_LIMIT:
+            print(f"Menampilkan {SEARCH_LIMIT} hasil teratas. Perjelas kata kunci untuk hasil lain.")
         pause()
 
     def ui_register(self):
@@ -152,7 +164,9 @@ class CLI:
             print("3. Tambah buku")
             print("4. Ubah stok buku")
             print("5. Hapus buku")
-            print("6. Logout")
+            print("6. Statistik kinerja")
+            print("7. Laporan sirkulasi")
+            print("8. Logout")
             c = input("Pilih menu: ").strip()
             try:
                 if c == "1":
@@ -166,6 +180,10 @@ class CLI:
                 elif c == "5":
                     self.ui_admin_delete_book()
                 elif c == "6":
+                    self.ui_admin_stats()
+                elif c == "7":
+                    self.ui_admin_reports()
+                elif c == "8":
                     break
                 else:
                     print("Pilihan tidak valid.")
@@ -184,7 +202,8 @@ class CLI:
             print("4. Pinjam buku")
             print("5. Kembalikan buku")
             print("6. Riwayat peminjaman")
-            print("7. Logout")
+            print("7. Antrean saya")
+            print("8. Logout")
             c = input("Pilih menu: ").strip()
             try:
                 if c == "1":
@@ -200,6 +219,8 @@ class CLI:
                 elif c == "6":
                     self.ui_user_history(user)
                 elif c == "7":
+                    self.ui_user_holds(user)
+                elif c == "8":
                     break
                 else:
                     print("Pilihan tidak valid.")
@@ -246,15 +267,138 @@ class CLI:
             print(str(e))
         pause()
 
+    def ui_admin_stats(self):
+        clear_screen()
+        print("=== Admin: Statistik Kinerja ===")
+        if self.metrics is None:
+            print("Metrik tidak aktif.")
+            pause()
+            return
+        snap = self.metrics.snapshot()
+        hists = snap["histograms"]
+
+        print("\n-- Repository (panggilan, rata-rata, p50, p99 dalam ms) --")
+        for h in sorted((h for h in hists if h["name"] == "repo_call_seconds"), key=lambda h: -h["sum"]):
+            avg = h["sum"] / h["count"] * 1000 if h["count"] else 0
+            print(f"{h['labels']['method']:<45} {h['count']:>7} {avg:>8.2f} {h['p50'] * 1000:>8.2f} {h['p99'] * 1000:>8.2f}")
+
+        print("\n-- 10 query SQL dengan total waktu terbesar (jumlah, total ms) --")
+        queries = sorted((h for h in hists if h["name"] == "sql_query_seconds"), key=lambda h: -h["sum"])
+        for h in queries[:10]:
+            print(f"{h['count']:>7} {h['sum'] * 1000:>10.1f}  {h['labels']['statement'][:90]}")
+
+        print("\n-- Lainnya --")
+        for item in snap["counters"] + snap["gauges"]:
+            if not item["labels"]:
+                print(f"{item['name']:<45} {item['value']}")
+        pause()
+
+    def ui_admin_reports(self):
+        clear_screen()
+        print("=== Admin: Laporan Sirkulasi ===")
+        if self.reports is None:
+            print("Laporan tidak aktif.")
+            pause()
+            return
+
+        print("\n-- 10 buku paling sering dipinjam (total, sedang dipinjam/eksemplar) --")
+        rows = self.reports.top_books(10)
+        if not rows:
+            print("Belum ada peminjaman.")
+        for r in rows:
+            used = f"{r.active_loans}/{r.copies_total or 0}" + (f" ({r.utilization:.0%})" if r.copies_total else "")
+            print(f"{r.id:>6} {r.title[:40]:<40} {r.author[:20]:<20} {r.loans_total:>6}  {used}")
+
+        print("\n-- 10 pengunjung paling aktif (total, sedang dipinjam) --")
+        for r in self.reports.top_users(10):
+            print(f"{r.username[:30]:<30} {r.loans_total:>6} {r.active_loans:>6}")
+
+        print("\n-- 14 hari terakhir (pinjam, kembali) --")
+        for r in self.reports.daily(14):
+            print(f"{r.day}  {r.loans:>6} {r.returns:>6}")
+
+        book_id = input("\nID buku untuk detail pemakaian (Enter = selesai): ").strip()
+        if book_id:
+            s = self.reports.utilization(int(book_id))
+            print(
+                f"{s.title} - {s.author}: dipinjam {s.loans_total} kali, "
+                f"{s.active_loans}/{s.copies_total} eksemplar sedang dipinjam ({s.utilization:.0%})"
+            )
+        pause()
+
     def ui_user_borrow(self, user: User):
         clear_screen()
         self.ui_list_available()
+        raw = input("Masukkan ID buku yang ingin dipinjam (pisahkan dengan koma untuk beberapa buku): ")
+        try:
+            book_ids = [int(part) for part in raw.replace(",", " ").split()]
+        except ValueError as e:
+            print(str(e))
+            pause()
+            return
+        if len(book_ids) > 1:
+            self._ui_borrow_many(user, book_ids)
+            pause()
+            return
+        if not book_ids:
+            print("Input tidak valid.")
+            pause()
+            return
+        book_id = book_ids[0]
         try:
-            book_id = int(input("Masukkan ID buku yang ingin dipinjam: ").strip())
             self.loans.borrow(user, book_id)
             print("Peminjaman berhasil. Batas pengembalian 7 hari dari sekarang.")
         except ValueError as e:
             print(str(e))
+            self._offer_hold(user, book_id)
+        pause()
+
+    def _ui_borrow_many(self, user: User, book_ids):
+        try:
+            results = self.loans.borrow_many(user, book_ids, atomic=False)
+        except ValueError as e:
+            print(str(e))
+            return
+        for r in results:
+            print(f"[{r.book_id}] " + ("berhasil dipinjam" if r.ok else r.error))
+        done = sum(r.ok for r in results)
+        print(f"{done} dari {len(results)} buku berhasil dipinjam. Batas pengembalian 7 hari dari sekarang.")
+
+    def _offer_hold(self, user: User, book_id: int):
+        if self.holds is None:
+            return
+        available = self.books.available_copies(book_id)
+        if available is None or available > 0:
+            return
+        if input("Masuk antrean untuk buku ini? (y/n): ").strip().lower() == "y":
+            try:
+                self.holds.place(user, book_id)
+                print("Anda masuk antrean. Buku akan disisihkan untuk Anda saat dikembalikan.")
+            except ValueError as e:
+                print(str(e))
+
+    def ui_user_holds(self, user: User):
+        clear_screen()
+        print("=== Antrean Saya ===")
+        if self.holds is None:
+            print("Fitur antrean tidak aktif.")
+            pause()
+            return
+        rows = self.holds.by_user(user)
+        if not rows:
+            print("Anda tidak sedang mengantre buku.")
+            pause()
+            return
+        for r in rows:
+            if r.status == Hold.READY:
+                status = f"SIAP DIPINJAM sampai {r.expires_at[:16]}"
+            else:
+                status = f"urutan ke-{r.position}"
+            print(f"[{r.hold_id}] {r.title} - {r.author} | {status}")
+        hold_id = input("ID antrean yang ingin dibatalkan (Enter = kembali): ").strip()
+        if hold_id:
+            self.holds.cancel(user, int(hold_id))
+            print("Antrean dibatalkan.")
         pause()
 
     def ui_user_return(self, user: User):
@@ -265,7 +409,7 @@ class CLI:
             pause()
             return
         for r in rows:
-            print(f"[{r['loan_id']}] {r['title']} - {r['author']} | Dipinjam: {r['loan_date']} | Jatuh tempo: {r['due_date']}")
+            print(f"[{r.loan_id}] {r.title} - {r.author} | Dipinjam: {r.loan_date} | Jatuh tempo: {r.due_date}")
         try:
             loan_id = int(input("Masukkan ID peminjaman yang ingin dikembalikan: ").strip())
             self.loans.return_book(user, loan_id)
@@ -275,12 +419,28 @@ class CLI:
         pause()
 
     def ui_user_history(self, user: User):
-        clear_screen()
-        rows = self.loans.history_by_user(user)
-        if not rows:
-            print("Belum ada riwayat peminjaman.")
-        else:
+        cursor = None
+        archived = False
+        page_no = 1
+        while True:
+            clear_screen()
+            rows, cursor = self.loans.history_page(user, cursor, PAGE_SIZE, archived)
+            print(f"=== Riwayat Peminjaman{' (arsip)' if archived else ''} (halaman {page_no}) ===")
+            if not rows and page_no == 1:
+                print("Belum ada riwayat peminjaman." if not archived else "Arsip kosong.")
             for r in rows:
-                status = "Dikembalikan" if r["return_date"] else "Dipinjam"
-                print(f"{r['title']} - {r['author']} | Pinjam: {r['loan_date']} | Jatuh tempo: {r['due_date']} | Status: {status}")
-        pause()
+                status = "Dikembalikan" if r.return_date else "Dipinjam"
+                print(f"{r.title} - {r.author} | Pinjam: {r.loan_date} | Jatuh tempo: {r.due_date} | Status: {status}")
+            if cursor is None:
+                if archived:
+                    pause()
+                    return
+                # older, archived loans are only read when asked for
+                if input("a = lihat riwayat lama (arsip), Enter = selesai: ").strip().lower() != "a":
+                    return
+                archived = True
+                page_no = 1
+                continue
+            if input("Enter = halaman berikutnya, q = selesai: ").strip().lower() == "q":
+                return
+            page_no += 1
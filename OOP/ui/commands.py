@@ -0,0 +1,187 @@
+"""Non-interactive command mode: single commands or JSON lines from stdin.
+
+    python main.py borrow --user budi --book 12 [--book 13 --partial]
+    python main.py return --user budi --loan 40
+    python main.py search "laskar pelangi" --limit 5
+    python main.py report books|users|daily [--limit N]
+    python main.py batch < perintah.jsonl
+
+A batch line is one object, e.g. ``{"cmd": "borrow", "user": "budi",
+"book": 12}``, and gets exactly one JSON line back: ``{"ok": true, ...}``
+with the result, or ``{"ok": false, "error": "..."}``. An ``"id"`` field is
+echoed so callers can match answers to requests. The whole batch shares one
+service graph (and, from main.py, one database connection).
+
+Commands run as a trusted desk operator: users are named, not logged in.
+"""
+
+import json
+import logging
+
+from entities import User
+from application.services import AuthService, BookService, LoanService, HoldService, ReportService, SEARCH_LIMIT
+from ui.common import row_dict, parse_int, parse_limit, busy_message
+
+REPORT_LIMIT = 10
+
+log = logging.getLogger("perpustakaan.commands")
+
+
+class CommandRunner:
+    """Executes command dicts against the services and returns JSON-ready dicts."""
+
+    def __init__(self, auth: AuthService, books: BookService, loans: LoanService, holds: HoldService = None,
+                 reports: ReportService = None):
+        self.auth = auth
+        self.books = books
+        self.loans = loans
+        self.holds = holds
+        self.reports = reports
+        self.commands = {
+            "search": self.search,
+            "book": self.get_book,
+            "available": self.book_availability,
+            "borrow": self.borrow,
+            "return": self.return_loans,
+            "loans": self.active_loans,
+            "hold": self.place_hold,
+            "report": self.report,
+            "import": self.import_books,
+        }
+        self._users = {}
+
+    def run(self, command: dict) -> dict:
+        """Run one command; errors are returned, not raised, so a batch keeps going."""
+        cmd = command.get("cmd")
+        handler = self.commands.get(cmd) if isinstance(cmd, str) else None
+        if handler is None:
+            result = {"ok": False, "error": f"Perintah tidak dikenal: {cmd!r}"}
+        else:
+            try:
+                result = {"ok": True, **handler(command)}
+            except ValueError as e:
+                result = {"ok": False, "error": str(e)}
+            except Exception as e:
+                message = busy_message(e)
+                if message is None:
+                    log.exception("perintah %r gagal", cmd)
+                    message = f"Terjadi kesalahan: {type(e).__name__}"
+                result = {"ok": False, "error": message}
+        if "id" in command:
+            result["id"] = command["id"]
+        return result
+
+    def run_lines(self, lines, out) -> int:
+        """Run every JSON line of ``lines``, writing one result line each; returns the failure count."""
+        failed = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                command = json.loads(line)
+            except json.JSONDecodeError:
+                command = None
+            if isinstance(command, dict):
+                result = self.run(command)
+            else:
+                result = {"ok": False, "error": "Baris bukan objek JSON yang valid"}
+            failed += not result["ok"]
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        return failed
+
+    # helpers
+
+    def _user(self, command) -> User:
+        username = str(command.get("user") or "").strip()
+        if not username:
+            raise ValueError("'user' wajib diisi")
+        user = self._users.get(username)
+        if user is None:
+            user = self.auth.find_user(username)
+            if user is None:
+                raise ValueError(f"Pengguna '{username}' tidak ditemukan")
+            self._users[username] = user
+        return user
+
+    def _ints(self, command, single, many):
+        """Ids given either as ``single`` (one value) or ``many`` (a list)."""
+        if command.get(many) is not None:
+            values = command[many]
+            if not isinstance(values, list):
+                raise ValueError(f"'{many}' harus berupa daftar")
+            return [parse_int(v, many) for v in values]
+        return [parse_int(command.get(single), single)]
+
+    # commands
+
+    def search(self, command):
+        limit = parse_limit(command.get("limit"), SEARCH_LIMIT)
+        return {"books": [row_dict(r) for r in self.books.search(str(command.get("q") or ""), limit)]}
+
+    def get_book(self, command):
+        row = self.books.get(parse_int(command.get("book"), "book"))
+        if row is None:
+            raise ValueError("Buku tidak ditemukan")
+        return {"book": row_dict(row)}
+
+    def book_availability(self, command):
+        book_id = parse_int(command.get("book"), "book")
+        available = self.books.available_copies(book_id)
+        if available is None:
+            raise ValueError("Buku tidak ditemukan")
+        return {"book_id": book_id, "available": available}
+
+    def borrow(self, command):
+        user = self._user(command)
+        book_ids = self._ints(command, "book", "books")
+        if len(book_ids) == 1:
+            self.loans.borrow(user, book_ids[0])
+            return {"book_id": book_ids[0]}
+        results = self.loans.borrow_many(user, book_ids, command.get("atomic", True) is not False)
+        if not any(r.ok for r in results):
+            raise ValueError("; ".join(f"{r.book_id}: {r.error}" for r in results))
+        return {"results": [row_dict(r) for r in results]}
+
+    def return_loans(self, command):
+        user = self._user(command)
+        loan_ids = self._ints(command, "loan", "loans")
+        if len(loan_ids) == 1:
+            self.loans.return_book(user, loan_ids[0])
+            return {"returned": loan_ids}
+        return {"returned": self.loans.return_many(user, loan_ids)}
+
+    def active_loans(self, command):
+        return {"loans": [row_dict(r) for r in self.loans.active_loans_by_user(self._user(command))]}
+
+    def place_hold(self, command):
+        if self.holds is None:
+            raise ValueError("Fitur antrean tidak aktif")
+        user = self._user(command)
+        return {"hold_id": self.holds.place(user, parse_int(command.get("book"), "book"))}
+
+    def report(self, command):
+        if self.reports is None:
+            raise ValueError("Laporan tidak aktif")
+        kind = command.get("kind", "books")
+        limit = parse_limit(command.get("limit"), REPORT_LIMIT if kind != "daily" else 14)
+        if kind == "books":
+            rows = self.reports.top_books(limit)
+        elif kind == "users":
+            rows = self.reports.top_users(limit)
+        elif kind == "daily":
+            rows = self.reports.daily(limit)
+        else:
+            raise ValueError("'kind' harus books, users atau daily")
+        return {"kind": kind, "rows": [row_dict(r) for r in rows]}
+
+    def import_books(self, command):
+        path = str(command.get("path") or "")
+        if not path:
+            raise ValueError("'path' wajib diisi")
+        try:
+            stats = self.books.bulk_import(path, fmt=command.get("format"), resume=bool(command.get("resume")))
+        except OSError as e:
+            raise ValueError(f"File tidak dapat dibaca: {e.strerror or e}") from None
+        return {"stats": stats}
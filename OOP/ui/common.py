@@ -0,0 +1,48 @@
+"""Helpers shared by the HTTP API and command mode: parsing request values,
+serializing entities and describing database errors."""
+
+import sqlite3
+
+from exceptions import DatabaseBusy
+
+# SQLite INTEGER range; anything outside raises OverflowError when bound
+MAX_INT = 2**63 - 1
+
+
+def row_dict(row):
+    """JSON-ready dict of an entity (or None)."""
+    # entities are slotted dataclasses; their slots are exactly the fields
+    return {name: getattr(row, name) for name in row.__slots__} if row is not None else None
+
+
+def parse_int(value, name, default=None) -> int:
+    """``value`` as an int; a missing value is ``default`` or, without one, an error."""
+    if value in (None, ""):
+        if default is None:
+            raise ValueError(f"'{name}' wajib diisi")
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' harus berupa angka") from None
+    if not -MAX_INT - 1 <= number <= MAX_INT:
+        raise ValueError(f"'{name}' di luar jangkauan")
+    return number
+
+
+def parse_limit(value, default: int, maximum: int = 500) -> int:
+    """Page/result size clamped to ``1..maximum``.
+
+    LIMIT 0 would leave no row to continue a cursor from, and SQLite reads
+    LIMIT -1 as "no limit".
+    """
+    return max(1, min(parse_int(value, "limit", default), maximum))
+
+
+def busy_message(exc: BaseException):
+    """Message for an error meaning "database momentarily busy, retry", else None."""
+    if isinstance(exc, DatabaseBusy):
+        return str(exc)
+    if isinstance(exc, sqlite3.OperationalError) and ("locked" in str(exc) or "busy" in str(exc)):
+        return "Database sedang sibuk, coba lagi"
+    return None
@@ -0,0 +1,382 @@
+"""JSON-over-HTTP entry point exposing the same services as the CLI.
+
+Built on ``http.server.ThreadingHTTPServer`` (one thread per connection,
+HTTP/1.1 keep-alive). Clients log in with ``POST /login`` and send the
+returned token as ``Authorization: Bearer <token>``.
+
+    GET    /books?cursor=&limit=&available=1   catalog page
+    GET    /books/search?q=&limit=             full-text search
+    GET    /books/<id>
+    GET    /books/<id>/availability            copies on the shelf
+    GET    /books/available-ids?cursor=&limit=
+    POST   /books                   (admin)    {"title","author","year","copies"}
+    PUT    /books/<id>/stock        (admin)    {"total"}
+    DELETE /books/<id>              (admin)
+    POST   /register                           {"username","password"}
+    POST   /login                              {"username","password"} -> {"token"}
+    POST   /logout
+    GET    /loans                              active loans of the caller
+    GET    /loans/history?cursor=&limit=&archived=1
+    POST   /loans                              {"book_id"}
+    POST   /loans/batch                        {"book_ids": [...], "atomic": true}
+    POST   /loans/<id>/return
+    POST   /loans/return                       {"loan_ids": [...]}
+    GET    /holds                              open holds of the caller
+    POST   /holds                              {"book_id"}
+    DELETE /holds/<id>
+"""
+
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from entities import User
+from exceptions import UsernameAlreadyExists
+from application.services import AuthService, BookService, LoanService, HoldService, PAGE_SIZE, SEARCH_LIMIT
+from ui.common import row_dict, parse_int, parse_limit, busy_message, MAX_INT
+
+SESSION_TTL = 8 * 3600
+MAX_BODY = 64 * 1024
+
+log = logging.getLogger("perpustakaan.http")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class SessionStore:
+    """In-memory bearer tokens with sliding expiry."""
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, user: User) -> str:
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = (user, time.monotonic() + self.ttl)
+        return token
+
+    def get(self, token: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < now:
+                del self._sessions[token]
+                return None
+            self._sessions[token] = (user, now + self.ttl)
+            return user
+
+    def drop(self, token: str):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+
+class LibraryAPI:
+    """Routes requests to the services; independent of the HTTP plumbing."""
+
+    def __init__(self, auth: AuthService, books: BookService, loans: LoanService, sessions: SessionStore = None,
+                 holds: HoldService = None):
+        self.auth = auth
+        self.books = books
+        self.loans = loans
+        self.sessions = sessions or SessionStore()
+        self.holds = holds
+        self.routes = [
+            ("GET", r"/books", self.list_books),
+            ("GET", r"/books/search", self.search_books),
+            ("GET", r"/books/(\d+)", self.get_book),
+            ("GET", r"/books/(\d+)/availability", self.book_availability),
+            ("GET", r"/books/available-ids", self.available_ids),
+            ("POST", r"/books", self.add_book),
+            ("PUT", r"/books/(\d+)/stock", self.update_stock),
+            ("DELETE", r"/books/(\d+)", self.delete_book),
+            ("POST", r"/register", self.register),
+            ("POST", r"/login", self.login),
+            ("POST", r"/logout", self.logout),
+            ("GET", r"/loans", self.active_loans),
+            ("GET", r"/loans/history", self.history),
+            ("POST", r"/loans", self.borrow),
+            ("POST", r"/loans/batch", self.borrow_many),
+            ("POST", r"/loans/return", self.return_many),
+            ("POST", r"/loans/(\d+)/return", self.return_book),
+            ("GET", r"/holds", self.list_holds),
+            ("POST", r"/holds", self.place_hold),
+            ("DELETE", r"/holds/(\d+)", self.cancel_hold),
+        ]
+        self.routes = [(m, re.compile(p + r"/?$"), h) for m, p, h in self.routes]
+
+    def dispatch(self, method: str, path: str, query: dict, body: dict, token: str):
+        """Return ``(status, payload)``; domain errors become 4xx responses.
+
+        A full connection pool or a lock that outlived ``busy_timeout`` is a
+        503 (the client may retry); anything else unexpected is logged and
+        answered with a 500 instead of dropping the connection.
+        """
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            # ids beyond SQLite's INTEGER range cannot name a row
+            if any(int(group) > MAX_INT for group in match.groups()):
+                return 404, {"error": "Tidak ditemukan"}
+            try:
+                return handler(*match.groups(), query=query, body=body, token=token)
+            except HTTPError as e:
+                return e.status, {"error": e.message}
+            except UsernameAlreadyExists:
+                return 409, {"error": "Username sudah terdaftar."}
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            except Exception as e:
+                busy = busy_message(e)
+                if busy:
+                    return 503, {"error": busy}
+                log.exception("%s %s gagal", method, path)
+                return 500, {"error": "Terjadi kesalahan pada server"}
+        if allowed:
+            return 405, {"error": "Metode tidak diizinkan"}
+        return 404, {"error": "Tidak ditemukan"}
+
+    # helpers
+
+    def _user(self, token):
+        user = self.sessions.get(token) if token else None
+        if user is None:
+            raise HTTPError(401, "Silakan login terlebih dahulu")
+        return user
+
+    def _admin(self, token):
+        user = self._user(token)
+        if not user.is_admin():
+            raise HTTPError(403, "Hanya admin")
+        return user
+
+    # books
+
+    def list_books(self, query, body, token):
+        size = parse_limit(query.get("limit"), PAGE_SIZE)
+        available = query.get("available") in ("1", "true")
+        rows, cursor = self.books.page(query.get("cursor"), size, available)
+        return 200, {"books": [row_dict(r) for r in rows], "next_cursor": cursor}
+
+    def search_books(self, query, body, token):
+        limit = parse_limit(query.get("limit"), SEARCH_LIMIT)
+        rows = self.books.search(query.get("q", ""), limit)
+        return 200, {"books": [row_dict(r) for r in rows]}
+
+    def get_book(self, book_id, query, body, token):
+        row = self.books.get(int(book_id))
+        if row is None:
+            raise HTTPError(404, "Buku tidak ditemukan")
+        return 200, row_dict(row)
+
+    def book_availability(self, book_id, query, body, token):
+        available = self.books.available_copies(int(book_id))
+        if available is None:
+            raise HTTPError(404, "Buku tidak ditemukan")
+        return 200, {"book_id": int(book_id), "available": available}
+
+    def available_ids(self, query, body, token):
+        size = parse_limit(query.get("limit"), PAGE_SIZE, 5000)
+        ids = self.books.available_ids(parse_int(query.get("cursor"), "cursor", 0), size)
+        return 200, {"book_ids": ids, "next_cursor": str(ids[-1]) if len(ids) == size else None}
+
+    def add_book(self, query, body, token):
+        self._admin(token)
+        title = str(body.get("title") or "").strip()
+        author = str(body.get("author") or "").strip()
+        if not title or not author:
+            raise ValueError("Input tidak valid.")
+        year = body.get("year")
+        copies = parse_int(body.get("copies"), "copies")
+        self.books.add(title, author, parse_int(year, "year") if year not in (None, "") else None, copies)
+        return 201, {"ok": True}
+
+    def update_stock(self, book_id, query, body, token):
+        self._admin(token)
+        self.books.update_stock(int(book_id), parse_int(body.get("total"), "total"))
+        return 200, {"ok": True}
+
+    def delete_book(self, book_id, query, body, token):
+        self._admin(token)
+        self.books.delete(int(book_id))
+        return 200, {"ok": True}
+
+    # auth
+
+    def register(self, query, body, token):
+        username = str(body.get("username") or "").strip()
+        password = str(body.get("password") or "")
+        if not username:
+            raise ValueError("Username tidak boleh kosong")
+        if len(password) < 6:
+            raise ValueError("Password minimal 6 karakter")
+        self.auth.register(username, password)
+        return 201, {"ok": True}
+
+    def login(self, query, body, token):
+        user = self.auth.login(str(body.get("username") or ""), str(body.get("password") or ""))
+        if not user:
+            raise HTTPError(401, "Login gagal")
+        return 200, {
+            "token": self.sessions.create(user),
+            "user": {"id": user.id, "username": user.username, "role": user.role},
+        }
+
+    def logout(self, query, body, token):
+        if token:
+            self.sessions.drop(token)
+        return 200, {"ok": True}
+
+    # loans
+
+    def active_loans(self, query, body, token):
+        user = self._user(token)
+        return 200, {"loans": [row_dict(r) for r in self.loans.active_loans_by_user(user)]}
+
+    def history(self, query, body, token):
+        user = self._user(token)
+        size = parse_limit(query.get("limit"), PAGE_SIZE)
+        archived = query.get("archived") in ("1", "true")
+        rows, cursor = self.loans.history_page(user, query.get("cursor"), size, archived)
+        return 200, {"loans": [row_dict(r) for r in rows], "next_cursor": cursor}
+
+    def borrow(self, query, body, token):
+        user = self._user(token)
+        self.loans.borrow(user, parse_int(body.get("book_id"), "book_id"))
+        return 201, {"ok": True}
+
+    def borrow_many(self, query, body, token):
+        user = self._user(token)
+        ids = body.get("book_ids")
+        if not isinstance(ids, list):
+            raise ValueError("'book_ids' harus berupa daftar")
+        atomic = body.get("atomic", True) is not False
+        results = self.loans.borrow_many(user, [parse_int(i, "book_ids") for i in ids], atomic)
+        status = 201 if any(r.ok for r in results) else 409
+        return status, {"results": [row_dict(r) for r in results]}
+
+    def return_book(self, loan_id, query, body, token):
+        user = self._user(token)
+        self.loans.return_book(user, int(loan_id))
+        return 200, {"ok": True}
+
+    def return_many(self, query, body, token):
+        user = self._user(token)
+        ids = body.get("loan_ids")
+        if not isinstance(ids, list):
+            raise ValueError("'loan_ids' harus berupa daftar")
+        returned = self.loans.return_many(user, [parse_int(i, "loan_ids") for i in ids])
+        return 200, {"returned": returned}
+
+    # holds
+
+    def _hold_service(self):
+        if self.holds is None:
+            raise HTTPError(404, "Fitur antrean tidak aktif")
+        return self.holds
+
+    def list_holds(self, query, body, token):
+        user = self._user(token)
+        return 200, {"holds": [row_dict(r) for r in self._hold_service().by_user(user)]}
+
+    def place_hold(self, query, body, token):
+        user = self._user(token)
+        hold_id = self._hold_service().place(user, parse_int(body.get("book_id"), "book_id"))
+        return 201, {"hold_id": hold_id}
+
+    def cancel_hold(self, hold_id, query, body, token):
+        user = self._user(token)
+        self._hold_service().cancel(user, int(hold_id))
+        return 200, {"ok": True}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; without this, Nagle plus
+    # delayed ACK adds ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    server_version = "Perpustakaan/1.0"
+    api: LibraryAPI = None
+    quiet = True
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:].strip() if auth.startswith("Bearer ") else None
+        try:
+            body = self._read_body()
+        except HTTPError as e:
+            return self._send(e.status, {"error": e.message})
+        status, payload = self.api.dispatch(self.command, url.path, query, body, token)
+        self._send(status, payload)
+
+    def _read_body(self) -> dict:
+        """Parse the JSON body; a body left unread also closes the connection.
+
+        An unread body would be parsed as the next request on this
+        connection. Once it has been read (bad JSON, not an object) the
+        connection stays usable.
+        """
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise HTTPError(400, "Content-Length tidak valid")
+        if length > MAX_BODY:
+            self.close_connection = True
+            raise HTTPError(413, "Body terlalu besar")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPError(400, "Body harus JSON") from None
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Body harus objek JSON")
+        return body
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            # tell keep-alive clients instead of just dropping the socket
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(api: LibraryAPI, host: str = "127.0.0.1", port: int = 8000, quiet: bool = True):
+    handler = type("Handler", (_Handler,), {"api": api, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -1,38 +1,160 @@
 import os
+import sys
 import hashlib
 import hmac
 import binascii
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class VerificationCache:
+    """Bounded LRU of recent successful password checks, each valid for ``ttl`` seconds.
+
+    Entries are keyed by user plus an HMAC of (stored hash, password) under a
+    per-process random key, so neither passwords nor anything usable offline
+    is kept in memory. Changing a user's password changes the stored hash and
+    therefore misses the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, user, hashed: str, password: str):
+        msg = f"{hashed}\0{password}".encode()
+        return user, hmac.new(self._key, msg, hashlib.sha256).digest()
+
+    def hit(self, user, hashed: str, password: str) -> bool:
+        key = self._digest(user, hashed, password)
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < now:
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, user, hashed: str, password: str):
+        key = self._digest(user, hashed, password)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
 
 class PasswordHasher:
     """Simple, safer password hasher using PBKDF2-HMAC-SHA256 with per-password salt.
 
-    Stored format: <salt_hex>$<hash_hex>
+    Stored format: <iterations>$<salt_hex>$<hash_hex>
+    Hashes in the older <salt_hex>$<hash_hex> format used LEGACY_ITERATIONS.
+
+    With ``workers > 0`` the PBKDF2 work runs on a thread pool (hashlib
+    releases the GIL), which bounds how many derivations run at once and lets
+    callers submit checks without blocking. An optional ``VerificationCache``
+    skips PBKDF2 for repeated successful logins.
     """
 
     ITERATIONS = 100_000
+    LEGACY_ITERATIONS = 100_000
     SALT_SIZE = 16
 
-    def hash(self, password: str) -> str:
-        salt = hashlib.sha256(os.urandom(self.SALT_SIZE)).digest()[: self.SALT_SIZE]
-        dk = hashlib.pbkdf2_hmac(
-            "sha256", password.encode(), salt, self.ITERATIONS
+    def __init__(self, workers: int = 0, cache: VerificationCache = None):
+        self.cache = cache
+        self.workers = max(workers, 0)
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pbkdf2") if workers > 0 else None
         )
-        return f"{binascii.hexlify(salt).decode()}${binascii.hexlify(dk).decode()}"
 
-    def verify(self, hashed: str, password: str) -> bool:
+    def _derive(self, password: str, salt: bytes, iterations: int) -> bytes:
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+    def _parse(self, hashed: str):
+        parts = hashed.split("$") if hashed else []
         try:
-            salt_hex, hash_hex = hashed.split("$", 1)
-        except ValueError:
+            if len(parts) == 2:
+                iterations = self.LEGACY_ITERATIONS
+                salt_hex, hash_hex = parts
+            elif len(parts) == 3:
+                iterations = int(parts[0])
+                salt_hex, hash_hex = parts[1:]
+            else:
+                return None
+            return iterations, binascii.unhexlify(salt_hex), binascii.unhexlify(hash_hex)
+        except (ValueError, binascii.Error):
+            return None
+
+    def _hash(self, password: str) -> str:
+        salt = hashlib.sha256(os.urandom(self.SALT_SIZE)).digest()[: self.SALT_SIZE]
+        dk = self._derive(password, salt, self.ITERATIONS)
+        return f"{self.ITERATIONS}${binascii.hexlify(salt).decode()}${binascii.hexlify(dk).decode()}"
+
+    def _verify(self, hashed: str, password: str, user=None) -> bool:
+        parsed = self._parse(hashed)
+        if parsed is None:
             return False
-        salt = binascii.unhexlify(salt_hex)
-        expected = binascii.unhexlify(hash_hex)
-        dk = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.ITERATIONS)
-        return hmac.compare_digest(dk, expected)
+        if self.cache is not None and self.cache.hit(user, hashed, password):
+            return True
+        iterations, salt, expected = parsed
+        ok = hmac.compare_digest(self._derive(password, salt, iterations), expected)
+        if ok and self.cache is not None:
+            self.cache.add(user, hashed, password)
+        return ok
+
+    def submit_hash(self, password: str) -> Future:
+        return self._submit(self._hash, password)
+
+    def submit_verify(self, hashed: str, password: str, user=None) -> Future:
+        return self._submit(self._verify, hashed, password, user)
+
+    def _submit(self, fn, *args) -> Future:
+        if self._executor is not None:
+            return self._executor.submit(fn, *args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def hash(self, password: str) -> str:
+        return self.submit_hash(password).result()
+
+    def verify(self, hashed: str, password: str, user=None) -> bool:
+        """Check ``password``; pass ``user`` (e.g. username) to use the verification cache."""
+        return self.submit_verify(hashed, password, user).result()
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when ``hashed`` was made with a different cost than ITERATIONS."""
+        parsed = self._parse(hashed)
+        return parsed is not None and parsed[0] != self.ITERATIONS
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
 
 
 def clear_screen():
-    os.system("cls" if os.name == "nt" else "clear")
+    if not sys.stdout.isatty():
+        return
+    if os.name == "nt":
+        os.system("cls")
+    else:
+        # ANSI clear + cursor home; avoids spawning `clear` on every screen
+        sys.stdout.write("\033[2J\033[H")
+        sys.stdout.flush()
 
 
 def pause(msg="Tekan Enter untuk melanjutkan..."):